@@ -1,121 +1,120 @@
 # app.py
-import streamlit as st
-import sqlite3
+# plotly and fpdf are imported by the functions that draw figures or reports, so a session
+# that only looks at the metrics and the table never loads them
 import time
+script_started = time.perf_counter()
+import atexit
+import itertools
+import queue
+import streamlit as st
 import pandas as pd
-from functools import partial
 from datetime import datetime, timedelta, date, time as time_obj
-import pytz
-import plotly.graph_objects as go
-import plotly.express as px
-
-DATABASE_NAME = "baby_log.db"
-PDT = pytz.timezone('US/Pacific')
-yesterday = datetime.now(PDT) - timedelta(days=1)
+import storage
+from storage import LOCAL_TZ, create_table, load_daily_counts
+from forecast import rebase
+from metrics import compute_metrics, analyze_sleep_durations
+from timing import StageTimer
+from write_queue import WriteQueue
+imports_done = time.perf_counter()
+
+yesterday = datetime.now(LOCAL_TZ) - timedelta(days=1)
 start_date = st.sidebar.date_input("Show events from:", yesterday)
 # Get the current time, and subtract 24 hours
-now = datetime.now(PDT)
+now = datetime.now(LOCAL_TZ)
 twenty_four_hours_ago = now - timedelta(hours=24)
 midnight_time = time_obj(23, 59, 0)  # Hours, minutes, seconds
 midnight_datetime = datetime.combine(yesterday, midnight_time)
-midnight_datetime_pdt = PDT.localize(midnight_datetime)
-
-
-def create_table(dbname=DATABASE_NAME):
-    conn = sqlite3.connect(dbname)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS baby_events (
-            timestamp TEXT,
-            event TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def log_event(event, comments=""):
-    now_utc = datetime.utcnow()
-    now_str = now_utc.strftime("%Y-%m-%d %H:%M:%S")
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    if comments:
-        event=f"{event}+{comments}"
-    c.execute("INSERT INTO baby_events (timestamp, event) VALUES (?, ?)", (now_str, event))
-    conn.commit()
-    conn.close()
-    st.success(f"Logged: {event} at {now_utc.astimezone(PDT).strftime('%Y-%m-%d %H:%M:%S')} PDT")
-
-def extract_comment(s, idx=1):
-    if isinstance(s, str) and '+' in s:
+midnight_datetime_local = LOCAL_TZ.localize(midnight_datetime)
+# ?tenant=<name> picks the household's own database, without it the app uses baby_log.db
+try:
+    dbname = storage.database_for(st.query_params.get("tenant"))
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+# ?debug=1 shows how long each stage of this rerun took
+debug = st.query_params.get("debug") == "1"
+timer = StageTimer("app", enabled=debug, started=script_started)
+#only the first run in a process pays for the imports, later reruns find them loaded
+timer.add("imports", (imports_done - script_started) * 1000)
+# With live updates on, the metrics and the table refresh themselves this often without rerunning the page
+LIVE_INTERVAL = "30s"
+#the window keeps real datetimes, they are only turned into text here
+TIMESTAMP_COLUMN = st.column_config.DatetimeColumn("timestamp", format="YYYY-MM-DD HH:mm:ss")
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def event_window(start_date, dbname):
+    #shared by all sessions, new rows from the app or the broker are appended instead of reloading the window
+    return storage.EventWindow(start_date, dbname=dbname)
+
+@st.cache_resource(show_spinner=False)
+def writer():
+    #one writer thread per server process for every session and household; writes still queued at exit are finished
+    writes = WriteQueue().start()
+    atexit.register(writes.stop, 5)
+    return writes
+
+def outbox():
+    #this session's writes still in the queue: job id -> (label, rows to show meanwhile), the writer's answers,
+    #and the job ids, which have to outlive reruns since app.py itself runs again every time
+    if "outbox" not in st.session_state:
+        st.session_state.outbox = ({}, queue.SimpleQueue(), itertools.count(1))
+    return st.session_state.outbox
+
+def persist(write, label, rows=None):
+    """Queues write(cursor) and returns at once; `rows` (load_data's layout) are shown until it is committed."""
+    pending, results, job_ids = outbox()
+    job_id = next(job_ids)
+    pending[job_id] = (label, rows)
+    #the callbacks run on the writer thread, so they only post to the queue and reconcile() reads it
+    if not writer().submit(write, dbname=dbname, on_done=lambda _: results.put((job_id, None)),
+                           on_error=lambda e: results.put((job_id, e))):
+        del pending[job_id]
+        st.error(f"Not saved: {label}, too many writes are waiting. Please try again.")
+
+def reconcile():
+    """Forgets the writes that were committed and reports the ones that failed."""
+    pending, results, _ = outbox()
+    while True:
         try:
-            return s.split('+')[idx]
-        except IndexError:
-            return "" # Handles cases where there's no element at index 1
-    else:
-        return s if idx==0 else None   # Handles non-string or no '+' cases
-
-
-def load_data(start_date):
-    conn = sqlite3.connect(DATABASE_NAME)
-    df = pd.read_sql_query("SELECT rowid,timestamp, event FROM baby_events ORDER BY timestamp DESC", conn)
-    conn.close()
-    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize('UTC').dt.tz_convert(PDT)
-    df = df[df['timestamp'].dt.date >= start_date]
-    df['date'] = df['timestamp'].dt.date
-    df['time'] = df['timestamp'].dt.time
-
-    df['comments'] = df['event'].apply(partial(extract_comment,idx=1))
-    df['event'] = df['event'].apply(partial(extract_comment,idx=0))
-
-    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    return df
-
-def time_since_last(df, event_type, start_date):
+            job_id, error = results.get_nowait()
+        except queue.Empty:
+            break
+        label, _ = pending.pop(job_id, (None, None))
+        if error is not None:
+            st.error(f"Not saved: {label} ({error}). Please log it again.")
+
+def with_pending(df):
+    #rows of queued writes replace their stored row (same rowid) or are added; once committed the window has them
+    rows = [r for _, r in outbox()[0].values() if r is not None]
+    if not rows:
+        return df
+    rows = pd.concat(rows, ignore_index=True).drop_duplicates(['rowid', 'timestamp', 'event'], keep='last')
+    stored = set(zip(df['timestamp'], df['event']))
+    rows = rows[[r > 0 or (t, e) not in stored for r, t, e in zip(rows['rowid'], rows['timestamp'], rows['event'])]]
+    df = pd.concat([rows, df[~df['rowid'].isin(rows['rowid'])]], ignore_index=True)
+    df['type'] = df['type'].astype(str).astype('category')
+    return df.sort_values('timestamp', ascending=False, kind='stable', ignore_index=True)
+
+def log_events(events):
+    #events is a list of (event, comments), written in one transaction
+    now_utc = storage.utc_now()
+    label = ", ".join(event for event, _ in events)
+    persist(lambda c: storage.write_events(c, events, now_utc), label, storage.pending_events(events, now_utc))
+    for event, comments in events:
+        if comments:
+            event=f"{event}+{comments}"
+        st.toast(f"Logged: {event} at {now_utc.astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M:%S %Z')}", icon="✅")
 
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.date >= start_date] #this is in pdt
-    last_event_df = filtered_df[filtered_df['event'].str.startswith(event_type)]
-    last_event = last_event_df['timestamp'].max()
+def log_event(event, comments=""):
+    log_events([(event, comments)])
 
-    if pd.isnull(last_event):
-        if event_type == "Breastfeeding":
-            return "N/A",""
-        else:
-            return "N/A"
-    else:
-        last_event_dt = PDT.localize(datetime.strptime(last_event, '%Y-%m-%d %H:%M:%S'))
-        now_pdt = datetime.now(PDT)
-        last_event_epoch = int(last_event_dt.timestamp())
-        now_pdt_epoch = int(now_pdt.timestamp())
-        time_diff_seconds = now_pdt_epoch - last_event_epoch
-        time_diff = timedelta(seconds=time_diff_seconds)
-
-        if event_type == "Breastfeeding":
-            #For bf add modifier for side
-            last_event_string = last_event_df[last_event_df['timestamp']==last_event]["event"].iloc[0]
-            last_event_string = last_event_string.split(',')
-            modifier = ''
-            if 'R' in last_event_string:
-                modifier += ":point_right:"
-            if 'L' in last_event_string:
-                modifier += ':point_left:'
-            return time_diff, modifier
-        else:
-            return time_diff
-
-def count_events(df, event_type, start_time):
-    #only last 24 hrs not by date
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.tz_localize(PDT) >= start_time]
-    count = len(filtered_df[filtered_df['event'].str.startswith(event_type)])
-    return count
-
-def count_balance(df, start_date):
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.date >= start_date]
-    count = {"L":0, "R":0}
-    for el in filtered_df['event']:
-        if 'L' in el:
-            count['L'] +=1
-        if 'R' in el:
-            count['R'] +=1
+def count_balance(start_date):
+    #reads the daily rollup, so a long range costs one row per day
+    import plotly.graph_objects as go
+    daily = load_daily_counts(start_date, dbname=dbname)
+    feeds = daily[daily['type'] == "Breastfeeding"]
+    count = {"L": int(feeds['left_side'].sum()), "R": int(feeds['right_side'].sum())}
 
     fig = go.Figure(data=[go.Pie(labels=['left', 'right'], values=[count['L'], count['R']], marker_colors=['blue', 'red'])])
     fig.update_layout(
@@ -130,71 +129,42 @@ def count_balance(df, start_date):
 
     return count, fig
 
-def analyze_sleep_durations(df,start_date):
-    """
-    Analyzes sleep durations from a DataFrame of events.
-
-    Args:
-        df (pd.DataFrame): DataFrame with 'timestamp' and 'event' columns.
-        start_date (datetime.date): Date to start analysis from.
-
-    Returns:
-        list: A list of tuples, where each tuple contains (start_time, duration).
-    """
-
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(PDT)
-    df = df[df['timestamp'].dt.date >= start_date].sort_values(by='timestamp')
-
-    sleep_data = []
-    sleep_start = None
-
-    for index, row in df.iterrows():
-        event = row['event']
-        timestamp = row['timestamp']
-
-        if event.startswith("Sleep"):
-            sleep_start = timestamp
-        elif sleep_start and (event.startswith('Diaper') or event.startswith('Breastfeeding')):
-            sleep_end = timestamp
-            duration = sleep_end - sleep_start
-            sleep_data.append((sleep_start, duration))
-            sleep_start = None  # Reset sleep start
-
-    if sleep_data:
-        sleep_df = pd.DataFrame(sleep_data, columns=['start_time', 'duration'])
-        return sleep_df
-    else:
-        return pd.DataFrame(columns=['start_time', 'duration']) # return empty dataframe if no results.
-
 def update_logs(df_edited):
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
-        for index, row in df_edited.iterrows():
-            # st.markdown(edited_df)
-            combined_datetime = PDT.localize(datetime.combine(row['date'], row['time']))
-            combined_datetime_utc = combined_datetime.astimezone(pytz.utc).strftime('%Y-%m-%d %H:%M:%S')
-            if row['comments']:
-                combined_event_comment = f"{row['event']}+{row['comments']}"
-            else:
-                combined_event_comment =  row["event"]
-
-            c.execute("UPDATE baby_events SET timestamp = ?, event = ? WHERE rowid = ?", (combined_datetime_utc, combined_event_comment, row['rowid']))
-        conn.commit()
-        conn.close()
-        st.success("Timestamps updated!")
-    except ValueError:
-        st.error("Invalid timestamp format.")
+        updates = storage.edited_updates(df_edited)
+    except ValueError as e:
+        #a missing date or time; an archived row is only found by the write and reported by reconcile()
+        st.error(f"Not saved: {e}")
+        return
+    if updates:
+        persist(lambda c: storage.write_updates(c, updates), f"{len(updates)} edited events")
+        st.toast("Timestamps updated!", icon="✅")
+    else:
+        st.info("No changes to save.")
+
+def set_feed_duration(df):
+    #the duration is measured now, the comment shows on the last feed while the write is queued
+    now_utc = storage.utc_now()
+    feeds = df[df['type'] == "Breastfeeding"]
+    rows = None
+    if not feeds.empty:
+        rows = feeds.head(1).copy()
+        lasted = timedelta(seconds=int(now_utc.timestamp()) - int(rows['timestamp'].iloc[0].timestamp()))
+        rows['comments'] = f"Lasted {lasted}"
+        st.toast(f"Feed lasted {lasted}", icon="👩‍🍼")
+    persist(lambda c: storage.write_last_event_duration(c, "Breastfeeding", start_date, now_utc), "feed duration", rows)
+
+def report_pdf(day):
+    #imported on click, so viewing the dashboard never loads fpdf; a finished day comes from the render cache
+    from gen_report import report_pdf
+    return report_pdf(dbname, day)
 
 #Plot data that is showing in the table below on a radar plot
 def create_radar_plot(df, timestamp_column='timestamp'):
+    import plotly.graph_objects as go
 
     ## Filter only for events in the last 24 hrs.
-    df_filtered = df.copy()
-    ts = pd.to_datetime(df_filtered[timestamp_column]).dt.tz_localize(PDT)
-    # Filter the DataFrame
-    df_filtered = df_filtered[ts >= twenty_four_hours_ago]
+    df_filtered = df[df[timestamp_column] >= twenty_four_hours_ago]
 
     categories = ['Sleep','Breastfeeding', 'Pee', 'Poop']
     colors = ['magenta','brown', 'blue', 'green']
@@ -202,9 +172,9 @@ def create_radar_plot(df, timestamp_column='timestamp'):
     fig = go.Figure()
 
     idx = 0.5
-    date = df_filtered['date'].iloc[-1]
+    date = df_filtered['date'].iloc[-1] if not df_filtered.empty else twenty_four_hours_ago.date()
     for marker, category, color in zip(markers, categories, colors):
-        filtered_events = df_filtered[df_filtered['event'].str.startswith(category)]
+        filtered_events = df_filtered[df_filtered['type'] == category]
         times = [(t.hour + t.minute / 60)*360/24 for t in filtered_events['time']]
         dates = [1 if d==date else 0 for d in filtered_events['date']]
         comments = [a if a else "" for a in filtered_events['comments']]
@@ -235,27 +205,108 @@ def create_radar_plot(df, timestamp_column='timestamp'):
     return fig
 
 
-def add_time_to_last_event(df, time_to_add, event_type="Breastfeeding"):
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.date >= start_date] #this is in pdt
-    last_event_df = filtered_df[filtered_df['event'].str.startswith(event_type)]
-    last_event = last_event_df['timestamp'].max()
+def show_forecast(label, event_type, metrics):
+    #the statistics only see committed events, a newer one still in the queue moves the forecast along
+    last_seen = metrics.last.at[event_type, 'ts'] if event_type in metrics.last.index else None
+    f = rebase(storage.next_event(event_type, dbname=dbname), last_seen)
+    if f is None:
+        st.metric(label, "N/A")
+        return
+    st.metric(label, f.due.strftime("%H:%M"))
+    st.caption(f"likely {f.early:%H:%M}–{f.late:%H:%M}")
+
+def show_live_panel(edit_mode, loaded):
+    """The counts, the "Time since last" metrics and, outside edit mode, the event table.
 
-    if pd.isnull(last_event):
-        return "N/A"
+    With live updates on this runs on its own every LIVE_INTERVAL. The window only reads
+    the database when its change token moved, so a quiet interval costs one small query
+    plus the metrics, and the plots above are not redrawn.
+
+    `loaded` holds the window main() just read and is emptied here. The fragment's own
+    reruns get the same arguments, so they find it empty, read the window themselves and
+    log their stages with a StageTimer of their own, main()'s having finished already.
+    """
+    fragment_run = not loaded
+    run_timer = StageTimer("app live", enabled=debug) if fragment_run else timer
+    if fragment_run:
+        reconcile()
+        with run_timer.stage("load"):
+            df = event_window(start_date, dbname).get()
+        run_timer.record(tenant=st.query_params.get("tenant"), rows=len(df))
     else:
-        comment = f"Lasted {time_to_add}"
-        edited_df = last_event_df[last_event_df['timestamp']==last_event]
-        edited_df["comments"] = comment
-        update_logs(edited_df)
+        df = loaded.pop()
+    df = with_pending(df)
+    now = datetime.now(LOCAL_TZ)
+    midnight = LOCAL_TZ.localize(datetime.combine(now.date() - timedelta(days=1), midnight_time))
+    with run_timer.stage("metrics"):
+        metrics = compute_metrics(df, {'24h': now - timedelta(hours=24), 'today': midnight}, now=now)
+
+    # now_pdt = datetime.now(LOCAL_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+    # st.metric("**Current Time (PDT):**", now_pdt)
+    col1, col2,col3 = st.columns(3)
+    with col1:
+        st.metric("Pee count", metrics.count("Pee", '24h'))
+    with col2:
+        st.metric("Poop count", metrics.count("Poop", '24h'))
+    with col3:
+        #Find last feeding side
+        st.metric(":muscle: Tummy Time", metrics.count("Tummy Time", 'today'))
+
+    st.subheader("Time since last")
+    col3, col4, col4b= st.columns(3)
+    with col3:
+        st.metric("🩲 Diaper change", str(metrics.time_since("Diaper Change")))
+    with col4:
+        #Find last feeding side
+        st.metric(f"🍼 Feeding {metrics.feeding_side()}", str(metrics.time_since("Breastfeeding")))
+    with col4b:
+        st.metric(f":sleeping: Sleep", str(metrics.sleep_time_since()))
+
+    st.subheader("Next expected")
+    col8, col9 = st.columns(2)
+    with run_timer.stage("forecast"):
+        with col8:
+            show_forecast("🍼 Feeding", "Breastfeeding", metrics)
+        with col9:
+            show_forecast("🩲 Diaper change", "Diaper Change", metrics)
+
+    col4,col5, col6,col7 = st.columns(4)
+    # with col4:
+    #     st.metric(":woman: Pain Med", str(metrics.time_since("Mom Painmeds")))
+    # with col5:
+    #     st.metric(":woman: Antibiotic", "{}/4".format(metrics.count("Mom Antibiotic", 'today')))
+    with col5:
+        if str(metrics.time_since("Vitamin D")) != "N/A":
+            st.metric(":baby: Vitamin D", "✅")
+        else:
+            st.metric(":baby: Vitamin D", "⚠️")
+    with col6:
+        if str(metrics.time_since("Prenatal vitamins")) != "N/A":
+            st.metric(":woman: Prenatal vitamins", "✅")
+        else:
+            st.metric(":woman: Prenatal vitamins", "⚠️")
+
+    if not edit_mode:
+        with run_timer.stage("table"):
+            st.dataframe(df.drop(columns=['rowid','date','time','type','modifiers']),
+                         column_config={'timestamp': TIMESTAMP_COLUMN})
+
+    if fragment_run:
+        timings = run_timer.finish()
+        if debug:
+            st.caption(f"⏱️ Live refresh: {timings['total']} ms")
 
 
 def main():
     st.title("👶 Baby Tracking System 💜")
-    create_table()
+    create_table(dbname)
 
 
     disable_push =  bool(int(st.query_params.get("viewonly", "0")))
-    df = load_data(start_date)
+    reconcile()
+    with timer.stage("load"):
+        df = event_window(start_date, dbname).get()
+    timer.record(tenant=st.query_params.get("tenant"), rows=len(df))
 
     comments = st.sidebar.text_input("Comments")
 
@@ -272,11 +323,7 @@ def main():
         log_event(event, comments=comments)
 
     if st.sidebar.button("배불러", icon="👩‍🍼"):
-        last_time_feeding, _ = time_since_last(df, "Breastfeeding", start_date)
-        add_time_to_last_event(df, str(last_time_feeding), event_type="Breastfeeding")
-        st.sidebar.success("Done!")
-        time.sleep(1)
-        st.rerun()
+        set_feed_duration(with_pending(df))
 
     if st.sidebar.button("Sleep", icon="😴", disabled = disable_push):
         log_event('Sleep', comments=comments)
@@ -289,11 +336,12 @@ def main():
     poop_color = st.sidebar.selectbox("Poop color:", poop_color_options, index=2)
 
     if st.sidebar.button("Diaper Change",icon="🩲", disabled=disable_push):
-        log_event("Diaper Change")
+        events = [("Diaper Change", "")]
         if "Pee" in poop_pee_selection:
-            log_event("Pee")
+            events.append(("Pee", ""))
         if "Poop" in poop_pee_selection:
-            log_event(f"Poop, {poop_color}", comments=comments)
+            events.append((f"Poop, {poop_color}", comments))
+        log_events(events)
 
     if st.sidebar.button("Tummy Time", icon="💪", disabled=disable_push):
         log_event("Tummy Time")
@@ -310,15 +358,27 @@ def main():
     if st.sidebar.button("Vitamin D", icon=":material/water_drop:", disabled=disable_push):
         log_event("Vitamin D")
 
+    st.sidebar.divider()
+    report_day = st.sidebar.date_input("Report for:", yesterday.date())
+    st.sidebar.download_button("Report", data=lambda: report_pdf(report_day), file_name=f"report-{report_day}.pdf",
+                               mime="application/pdf", icon="📄")
+
+
+    edit_mode = st.sidebar.checkbox("Edit Logs", disabled=disable_push)
+    live = st.sidebar.toggle("Live updates", value=st.query_params.get("live") == "1",
+                             help="Keeps the metrics and the table current, e.g. on a wall tablet")
 
     stats = st.toggle("Show daily stats")
     if stats:
+        #the editor below keeps the stored rows only, queued ones have no rowid yet
+        shown = with_pending(df)
         # cola, colb= st.columns(2)
         # with cola:
-        fig = create_radar_plot(df)
-        st.plotly_chart(fig)
+        with timer.stage("radar plot"):
+            fig = create_radar_plot(shown)
+            st.plotly_chart(fig)
         # with colb:
-        #     ctr, fig = count_balance(df, start_date)
+        #     ctr, fig = count_balance(start_date)
         #     st.plotly_chart(fig)
 
         colc, cold = st.columns(2)
@@ -347,7 +407,8 @@ def main():
             else:
                 return f"{date_str} / Night / {time_str}"
 
-        sleep_df = analyze_sleep_durations(df, start_date)
+        with timer.stage("sleep analysis"):
+            sleep_df = analyze_sleep_durations(shown, start_date)
         if not sleep_df.empty:
             with colc:
                 last_duration = sleep_df['duration'].iloc[-1]
@@ -372,66 +433,27 @@ def main():
 
         st.divider()
 
-    # now_pdt = datetime.now(PDT).strftime("%Y-%m-%d %H:%M:%S %Z")
-    # st.metric("**Current Time (PDT):**", now_pdt)
-    col1, col2,col3 = st.columns(3)
-    with col1:
-        st.metric("Pee count", count_events(df, "Pee", twenty_four_hours_ago))
-    with col2:
-        st.metric("Poop count", count_events(df, "Poop", twenty_four_hours_ago))
-    with col3:
-        #Find last feeding side
-        st.metric(":muscle: Tummy Time", count_events(df, "Tummy Time", midnight_datetime_pdt))
-
-    st.subheader("Time since last")
-    col3, col4, col4b= st.columns(3)
-    with col3:
-        last_time_diaper = time_since_last(df, "Diaper Change", start_date)
-        st.metric("🩲 Diaper change", str(last_time_diaper))
-    with col4:
-        #Find last feeding side
-        last_time_feeding, modifier = time_since_last(df, "Breastfeeding", start_date)
-        st.metric(f"🍼 Feeding {modifier}", str(last_time_feeding))
-    with col4b:
-        #Find last feeding side
-        last_time = time_since_last(df, "Sleep", start_date)
-        if all(a!="N/A" for a in [last_time, last_time_diaper, last_time_feeding]) and last_time < last_time_diaper and last_time < last_time_feeding:
-            st.metric(f":sleeping: Sleep", str(last_time))
-        else:
-            st.metric(f":sleeping: Sleep", "N/A")
-
-    col4,col5, col6,col7 = st.columns(4)
-    # with col4:
-    #     st.metric(":woman: Pain Med", str(time_since_last(df, "Mom Painmeds", start_date)))
-    # with col5:
-    #     st.metric(":woman: Antibiotic", "{}/4".format(count_events(df, "Mom Antibiotic", midnight_datetime_pdt)))
-    with col5:
-        if str(time_since_last(df, "Vitamin D", start_date)) != "N/A":
-            st.metric(":baby: Vitamin D", "✅")
-        else:
-            st.metric(":baby: Vitamin D", "⚠️")
-    with col6:
-        if str(time_since_last(df, "Prenatal vitamins", start_date)) != "N/A":
-            st.metric(":woman: Prenatal vitamins", "✅")
-        else:
-            st.metric(":woman: Prenatal vitamins", "⚠️")
-
-
-
-
-    edit_mode = st.sidebar.checkbox("Edit Logs", disabled=disable_push)
+    live_panel = st.fragment(show_live_panel, run_every=LIVE_INTERVAL if live else None)
+    #the panel uses the window read above instead of reading it a second time
+    live_panel(edit_mode, [df])
 
     if edit_mode:
-        df_edited = st.data_editor(df, column_config={
-            'time': st.column_config.TimeColumn("Time")
-        }, hide_index=True, disabled = ['rowid', 'timestamp' ])
+        with timer.stage("table"):
+            df_edited = st.data_editor(df, column_config={
+                'timestamp': TIMESTAMP_COLUMN,
+                'time': st.column_config.TimeColumn("Time"),
+                'type': None,
+                'modifiers': None,
+            }, hide_index=True, disabled = ['rowid', 'timestamp' ])
 
         if st.button("Save Edits"):
-            update_logs(df_edited)
-            time.sleep(1)
-            st.rerun()
-    else:
-        st.dataframe(df.drop(columns=['rowid','date','time']))
+            #only rows that differ from what the editor was opened with are written
+            update_logs(storage.changed_rows(df, df_edited))
+
+    timings = timer.finish()
+    if debug:
+        with st.expander("⏱️ Timings (ms)", expanded=True):
+            st.dataframe(pd.Series(timings, name="ms"))
 
 
 if __name__ == "__main__":
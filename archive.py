@@ -0,0 +1,153 @@
+# archive.py
+# Moves events older than a few months out of SQLite into Parquet files, one directory per
+# local month (<db>_archive/month=YYYY-MM/part-*.parquet), so the live database stays small.
+# storage.load_data reads the archive back when a window reaches that far, touching only the
+# months it needs. daily_counts is left alone, so History keeps counting archived days.
+import os
+from datetime import datetime, timedelta, timezone
+import storage
+from storage import DATABASE_NAME, LOCAL_TZ
+
+DEFAULT_AGE_DAYS = 180
+ARCHIVE_COLUMNS = ["rowid", "timestamp", "ts", "event", "type", "modifiers", "comment"]
+# DELETE ... RETURNING takes the write lock and the rows in one statement, so nothing
+# can change a row between reading it and removing it
+DELETE_MONTH = """
+    DELETE FROM baby_events WHERE ts >= ? AND ts < ?
+    RETURNING rowid, timestamp, ts, event, type_id, modifiers, comment
+"""
+RAISE_HORIZON = "UPDATE db_state SET archived_before = MAX(archived_before, ?) WHERE id = 1"
+
+
+def archive_dir(dbname=DATABASE_NAME):
+    return os.path.splitext(dbname)[0] + "_archive"
+
+def month_start(day):
+    return day.replace(day=1)
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("rowid", pa.int64()), ("timestamp", pa.string()), ("ts", pa.int64()), ("event", pa.string()),
+        ("type", pa.string()), ("modifiers", pa.string()), ("comment", pa.string()),
+    ])
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+
+def _write_month(dbname, month, rows, type_names):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    columns = list(zip(*rows))
+    table = pa.table({
+        "rowid": columns[0], "timestamp": columns[1], "ts": columns[2], "event": columns[3],
+        "type": [type_names[type_id] for type_id in columns[4]], "modifiers": columns[5], "comment": columns[6],
+    }, schema=_schema()).sort_by("ts")
+    directory = os.path.join(archive_dir(dbname), f"month={month:%Y-%m}")
+    os.makedirs(directory, exist_ok=True)
+    # Parts are never rewritten, a month archived again later just gets another one.
+    # The leading underscore hides the file from readers until it is complete.
+    name = f"part-{min(columns[0])}-{max(columns[0])}.parquet"
+    tmp = os.path.join(directory, f"_{name}.tmp")
+    pq.write_table(table, tmp, row_group_size=64 * 1024)
+    os.replace(tmp, os.path.join(directory, name))
+
+def archive_events(dbname=DATABASE_NAME, older_than_days=DEFAULT_AGE_DAYS, now=None):
+    """Moves whole local months older than `older_than_days` into Parquet. Returns the number of events moved.
+
+    Each month is its own transaction, so the broker never waits on more than one month's worth of writing.
+    """
+    now = now or datetime.now(LOCAL_TZ)
+    cutoff = month_start((now - timedelta(days=older_than_days)).date())
+    cutoff_epoch = storage.start_of_day_epoch(cutoff)
+    storage.create_table(dbname)
+    with storage.transaction(dbname) as c:
+        oldest = c.execute("SELECT MIN(ts) FROM baby_events WHERE ts < ?", (cutoff_epoch,)).fetchone()[0]
+        type_names = dict(c.execute("SELECT id, name FROM event_types").fetchall())
+
+    moved = 0
+    month = month_start(datetime.fromtimestamp(oldest, LOCAL_TZ).date()) if oldest is not None else cutoff
+    while month < cutoff:
+        end = next_month(month)
+        with storage.transaction(dbname) as c:
+            rows = c.execute(DELETE_MONTH, (storage.start_of_day_epoch(month), storage.start_of_day_epoch(end))).fetchall()
+            if rows:
+                _write_month(dbname, month, rows, type_names)
+                moved += len(rows)
+            # Moved with the rows, so load_data reads this month from Parquet from the moment it leaves
+            # SQLite, and a rebuild keeps its daily_counts even if archiving stops before the next month
+            c.execute(RAISE_HORIZON, (storage.start_of_day_epoch(end),))
+        month = end
+    with storage.transaction(dbname) as c:
+        c.execute(RAISE_HORIZON, (cutoff_epoch,))
+    return moved
+
+def open_archive(dbname=DATABASE_NAME):
+    """The archived months as one pyarrow dataset partitioned by 'month', or None if nothing was archived."""
+    import pyarrow.dataset as ds
+    directory = archive_dir(dbname)
+    if not os.path.isdir(directory):
+        return None
+    return ds.dataset(directory, format="parquet", partitioning=_partitioning(),
+                      schema=_schema().append(_partitioning().schema.field("month")))
+
+def read_archive(dbname, start_epoch, types=None, end_epoch=None):
+    """Archived events from start_epoch on (and before end_epoch), in load_data's raw column layout (newest first).
+
+    Only the month directories from start_epoch's month (to end_epoch's) are opened, and the ts and
+    type conditions are checked against each file's statistics before rows are read.
+    """
+    import pandas as pd
+    import pyarrow.dataset as ds
+    columns = ["rowid", "ts", "type", "modifiers", "comment"]
+    dataset = open_archive(dbname)
+    if dataset is None:
+        return pd.DataFrame(columns=["rowid", "ts", "type", "modifiers", "comments"])
+    # Months were cut in whatever zone was set when they were archived; a day's margin covers any zone
+    start_month = datetime.fromtimestamp(start_epoch - 86400, timezone.utc).strftime("%Y-%m")
+    condition = (ds.field("month") >= start_month) & (ds.field("ts") >= start_epoch)
+    if end_epoch is not None:
+        end_month = datetime.fromtimestamp(end_epoch + 86400, timezone.utc).strftime("%Y-%m")
+        condition &= (ds.field("month") <= end_month) & (ds.field("ts") < end_epoch)
+    if types:
+        condition &= ds.field("type").isin(list(types))
+    df = dataset.to_table(columns=columns, filter=condition).to_pandas()
+    # A month archived again after an interrupted run has its events in two parts. An id handed out
+    # again before ids were stable (schema._add_stable_ids) can belong to two events, with different ts.
+    df = df.rename(columns={"comment": "comments"}).drop_duplicates(["rowid", "ts"])
+    return df.sort_values(["ts", "rowid"], ascending=False, ignore_index=True)
+
+def archived_keys(dbname, start_epoch, end_epoch):
+    """(ts, type, modifiers, comment) of every archived event from start_epoch to end_epoch, inclusive."""
+    import pyarrow.dataset as ds
+    dataset = open_archive(dbname)
+    if dataset is None:
+        return set()
+    start_month = datetime.fromtimestamp(start_epoch - 86400, timezone.utc).strftime("%Y-%m")
+    condition = (ds.field("month") >= start_month) & (ds.field("ts") >= start_epoch) & (ds.field("ts") <= end_epoch)
+    columns = dataset.to_table(columns=["ts", "type", "modifiers", "comment"], filter=condition).to_pydict()
+    return set(zip(columns["ts"], columns["type"], columns["modifiers"], columns["comment"]))
+
+def max_archived_rowid(dbname=DATABASE_NAME):
+    """The highest rowid in the archive, 0 if nothing was archived."""
+    import pyarrow.compute as pc
+    dataset = open_archive(dbname)
+    if dataset is None:
+        return 0
+    return pc.max(dataset.to_table(columns=["rowid"])["rowid"]).as_py() or 0
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Moves old events from SQLite to month-partitioned Parquet files")
+    parser.add_argument("--db", default=DATABASE_NAME)
+    parser.add_argument("--older-than-days", type=int, default=DEFAULT_AGE_DAYS,
+                        help="archive whole months that ended at least this many days ago")
+    args = parser.parse_args()
+    moved = archive_events(args.db, args.older_than_days)
+    print(f"Archived {moved} events from {args.db} to {archive_dir(args.db)}")
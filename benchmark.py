@@ -0,0 +1,148 @@
+# benchmark.py
+# Times the dashboard and report pipeline on synthetic databases of a day, a month and
+# two years of events, and writes the results as JSON so runs can be compared.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+import storage
+import synthetic_data
+import gen_report
+from metrics import compute_metrics, analyze_sleep_durations
+from render_cache import RenderCache
+from storage import LOCAL_TZ
+
+SIZES = {"1d": 1, "1mo": 30, "2y": 730}
+STARTUP_DAYS = 30
+# Runs in a fresh interpreter so nothing is imported yet: the first run of app.py is what a
+# new server process pays before anything shows, the second is an ordinary rerun
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+loaded = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+first = time.perf_counter()
+at.run()
+print(json.dumps({
+    "streamlit_import_ms": round((loaded - started) * 1000, 3),
+    "first_render_ms": round((first - loaded) * 1000, 3),
+    "rerun_ms": round((time.perf_counter() - first) * 1000, 3),
+    "modules": sorted(m for m in ("plotly", "fpdf", "kaleido", "pyarrow") if m in sys.modules),
+    "errors": [e.value for e in at.exception],
+}))
+"""
+
+
+def timed(fn, repeat):
+    """Runs fn `repeat` times; returns its timings in ms and its last result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+def summarize(timings):
+    return {"min_ms": round(min(timings), 3), "median_ms": round(statistics.median(timings), 3), "runs": len(timings)}
+
+def bench_size(days, repeat, directory, now):
+    dbname = os.path.join(directory, f"bench_{days}d.db")
+    n = synthetic_data.write_events(synthetic_data.generate_events(days, end=now), dbname)
+    start_date = (now - timedelta(days=days)).date()
+    twenty_four_hours_ago = now - timedelta(hours=24)
+    results = {"days": days, "events": n}
+
+    def run(name, fn):
+        try:
+            timings, result = timed(fn, repeat)
+            results[name] = summarize(timings)
+            return result
+        except Exception as e:
+            # e.g. no Kaleido for the PDF's image; the other stages are still worth having
+            results[name] = {"error": f"{type(e).__name__}: {str(e).strip().splitlines()[0]}"}
+            return None
+
+    df = run("load_data", lambda: storage.load_data(start_date, dbname=dbname))
+    metrics = run("compute_metrics", lambda: compute_metrics(df, {'24h': twenty_four_hours_ago}, now=now))
+    run("time_since", lambda: [metrics.time_since(t) for t in ("Diaper Change", "Breastfeeding", "Vitamin D")])
+    run("count", lambda: [metrics.count(t, '24h') for t in ("Pee", "Poop")])
+    run("analyze_sleep_durations", lambda: analyze_sleep_durations(df, start_date))
+    run("create_radar_plot", lambda: gen_report.create_radar_plot(df, twenty_four_hours_ago))
+
+    edits = iter(range(repeat))
+    def edit():
+        # A different comment on the last 10 rows every run, so each one writes
+        edited = df.copy()
+        edited.loc[edited.index[-10:], 'comments'] = f"bench {next(edits)}"
+        return storage.update_logs(storage.changed_rows(df, edited), dbname=dbname)
+    run("update_logs", edit)
+
+    # An empty cache, so every run renders the image instead of reading it back
+    gen_report.render_cache = RenderCache(os.path.join(directory, "renders"), max_bytes=0)
+    run("generate_pdf_report_fpdf", lambda: gen_report.generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago, now=now))
+    return results
+
+
+def bench_startup(directory, now, days=STARTUP_DAYS):
+    """Time to first render of app.py on a month of events, in a new Python process."""
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    workdir = os.path.join(directory, "startup")
+    os.makedirs(workdir)
+    synthetic_data.write_events(synthetic_data.generate_events(days, end=now), os.path.join(workdir, storage.DATABASE_NAME))
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(app), "BABY_TENANT_DIR": os.path.join(workdir, "tenants")}
+    try:
+        done = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, app], cwd=workdir, env=env,
+                              capture_output=True, text=True, timeout=300, check=True)
+        return {"days": days, **json.loads(done.stdout.strip().splitlines()[-1])}
+    except (subprocess.SubprocessError, ValueError, IndexError) as e:
+        return {"days": days, "error": f"{type(e).__name__}: {str(e).strip().splitlines()[0]}"}
+
+
+def run_benchmarks(sizes=SIZES, repeat=5, startup=True):
+    now = datetime.now(LOCAL_TZ)
+    with tempfile.TemporaryDirectory() as directory:
+        results = {name: bench_size(days, repeat, directory, now) for name, days in sizes.items()}
+        startup_results = bench_startup(directory, now) if startup else None
+    return {
+        "created": now.isoformat(),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+        "startup": startup_results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times load, metrics, sleep analysis, plots, edits and the PDF report")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", action="append", choices=list(SIZES), help="only these sizes, can be repeated")
+    parser.add_argument("--no-startup", action="store_true", help="skip timing a cold start of the dashboard")
+    args = parser.parse_args()
+
+    sizes = {name: SIZES[name] for name in args.size} if args.size else SIZES
+    report = run_benchmarks(sizes, args.repeat, startup=not args.no_startup)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, result in report["results"].items():
+        print(f"{name} ({result['events']} events)")
+        for stage, timing in result.items():
+            if isinstance(timing, dict):
+                print(f"  {stage:26} {timing.get('median_ms', timing.get('error'))}")
+    if report["startup"]:
+        startup = report["startup"]
+        print(f"startup ({startup['days']} days): first render {startup.get('first_render_ms', startup.get('error'))} ms, "
+              f"rerun {startup.get('rerun_ms')} ms")
+    print(f"Wrote {args.output}")
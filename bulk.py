@@ -0,0 +1,221 @@
+# bulk.py
+# Imports events with their own timestamps from CSV or JSON exports, and exports the whole
+# history to CSV or Parquet. Both stream their rows, so memory stays flat however long the
+# history is, and imports write in large batches, one transaction each.
+import argparse
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+import pytz
+import storage
+from schema import split_event, join_event, event_type_id
+
+BATCH_SIZE = 100_000
+EXPORT_COLUMNS = ["timestamp", "event", "comments"]
+
+CREATE_STAGING = """
+    CREATE TEMP TABLE IF NOT EXISTS import_staging (
+        timestamp TEXT, ts INTEGER, event TEXT, type_id INTEGER, modifiers TEXT, comment TEXT
+    )
+"""
+INSERT_STAGING = "INSERT INTO import_staging (timestamp, ts, event, type_id, modifiers, comment) VALUES (?, ?, ?, ?, ?, ?)"
+# Rows already stored with the same time, type, modifiers and comment (or repeated within the
+# batch) are skipped. The parsed columns are compared rather than the event text, which older
+# rows spell differently, e.g. 'Poop, yellow'. The lookup goes through idx_baby_events_ts.
+INSERT_NEW_EVENTS = """
+    INSERT INTO baby_events (timestamp, ts, event, type_id, modifiers, comment)
+    SELECT MIN(s.timestamp), s.ts, MIN(s.event), s.type_id, s.modifiers, s.comment FROM import_staging s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM baby_events e
+        WHERE e.ts = s.ts AND e.type_id = s.type_id AND e.modifiers = s.modifiers AND e.comment IS s.comment
+    )
+    GROUP BY s.ts, s.type_id, s.modifiers, s.comment
+    ORDER BY s.ts
+"""
+
+
+def read_rows(path):
+    """Yields (timestamp, event, comments) from a .csv, .jsonl/.ndjson or .json file; comments may be None."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline="" if ext == ".csv" else None, encoding="utf-8") as f:
+        if ext == ".csv":
+            reader = csv.reader(f)
+            header = next(reader, [])
+            try:
+                t, e = header.index("timestamp"), header.index("event")
+            except ValueError:
+                raise ValueError(f"{path} needs 'timestamp' and 'event' columns")
+            c = header.index("comments") if "comments" in header else None
+            for row in reader:
+                if len(row) > max(t, e):
+                    yield row[t], row[e], row[c] if c is not None and c < len(row) else None
+                else:
+                    yield None, None, None
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row.get("timestamp"), row.get("event"), row.get("comments")
+        elif ext == ".json":
+            # A JSON array has to be parsed whole; use JSON lines for very large files
+            for row in json.load(f):
+                yield row.get("timestamp"), row.get("event"), row.get("comments")
+        else:
+            raise ValueError(f"Unsupported input format: {path} (use .csv, .jsonl or .json)")
+
+@lru_cache(maxsize=65536)
+def _hour_start(local_hour, tz):
+    #UTC epoch of the start of a local 'YYYY-MM-DD HH' in tz
+    naive = datetime.fromisoformat(local_hour + ":00")
+    return int((naive.replace(tzinfo=timezone.utc) if tz is pytz.utc else tz.localize(naive)).timestamp())
+
+@lru_cache(maxsize=65536)
+def _utc_hour_text(utc_hour):
+    return datetime.fromtimestamp(utc_hour * 3600, timezone.utc).strftime("%Y-%m-%d %H")
+
+def parse_timestamp(value, tz):
+    """ISO 8601 to (UTC 'YYYY-MM-DD HH:MM:SS', epoch seconds); times without an offset are taken to be in tz."""
+    value = value.strip()
+    if len(value) == 19 and value[10] in " T" and value[13] == value[16] == ":":
+        # The common 'YYYY-MM-DD HH:MM:SS' form: the zone is only looked up once per hour
+        minutes, seconds = int(value[14:16]), int(value[17:19])
+        if not (0 <= minutes < 60 and 0 <= seconds < 60):
+            raise ValueError(f"Invalid time: {value!r}")
+        ts = _hour_start(value[:10] + " " + value[11:13], tz) + minutes * 60 + seconds
+    else:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc) if tz is pytz.utc else tz.localize(when)
+        ts = int(when.timestamp())
+    minutes, seconds = divmod(ts % 3600, 60)
+    return f"{_utc_hour_text(ts // 3600)}:{minutes:02d}:{seconds:02d}", ts
+
+def import_events(path, dbname=storage.DATABASE_NAME, tz=pytz.utc, batch_size=BATCH_SIZE):
+    """Imports events from an export file. Returns (imported, duplicates, invalid) row counts.
+
+    Each row needs a timestamp and an event such as 'Breastfeeding,L'; a comment can be given as
+    'comments' or in the legacy 'event+comment' form. Rows that can't be parsed are skipped and
+    reported. Rows already stored with the same timestamp, type, modifiers and comment are skipped
+    too, archived ones included.
+    """
+    storage.create_table(dbname)
+    totals = [0, 0, 0]
+    type_ids = {}
+    batch = []
+
+    def flush():
+        with storage.transaction(dbname) as c:
+            rows = batch
+            archived_before = c.execute(storage.SELECT_ARCHIVED_BEFORE).fetchone()[0]
+            old = [row[1] for row in batch if row[1] < archived_before]
+            if old:
+                #months archive.py moved to Parquet are checked there, so restoring a backup stays idempotent
+                from archive import archived_keys
+                archived = archived_keys(dbname, min(old), max(old))
+                rows = [row for row in batch if row[1] >= archived_before or row[1:2] + row[3:] not in archived]
+            for name in {row[3] for row in rows} - type_ids.keys():
+                type_ids[name] = event_type_id(c, name)
+            c.execute(CREATE_STAGING)
+            c.executemany(INSERT_STAGING, [row[:3] + (type_ids[row[3]],) + row[4:] for row in rows])
+            last_rowid = c.execute("SELECT COALESCE(MAX(rowid), 0) FROM baby_events").fetchone()[0]
+            c.execute(INSERT_NEW_EVENTS)
+            added = storage.count_events_after(c, last_rowid)
+            c.execute("DELETE FROM import_staging")
+        totals[0] += added
+        totals[1] += len(batch) - added
+        batch.clear()
+
+    for line, (timestamp, event, comments) in enumerate(read_rows(path), start=1):
+        try:
+            timestamp, ts = parse_timestamp(timestamp, tz)
+            event_type, modifiers, comment = split_event(event)
+            if not event_type:
+                raise ValueError("empty event")
+        except (AttributeError, TypeError, ValueError) as e:
+            totals[2] += 1
+            if totals[2] <= 10:
+                print(f"Skipping row {line}: {e!r}")
+            continue
+        comment = comments or comment
+        event = join_event(event_type, modifiers)
+        if comment:
+            event = f"{event}+{comment}"
+        batch.append((timestamp, ts, event, event_type, modifiers, comment or None))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return tuple(totals)
+
+
+def iter_export_batches(dbname=storage.DATABASE_NAME, batch_size=BATCH_SIZE):
+    """Yields lists of (timestamp, event, comments) rows, oldest months first, archived ones included."""
+    from archive import open_archive
+    dataset = open_archive(dbname)
+    if dataset is not None:
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        #one month in memory at a time
+        months = pc.unique(dataset.to_table(columns=["month"])["month"]).to_pylist()
+        for month in sorted(months):
+            table = dataset.to_table(columns=["ts", "timestamp", "type", "modifiers", "comment"],
+                                     filter=ds.field("month") == month).sort_by("ts")
+            columns = table.to_pydict()
+            rows = [(ts, join_event(t, m), c) for ts, t, m, c in
+                    zip(columns["timestamp"], columns["type"], columns["modifiers"], columns["comment"])]
+            for i in range(0, len(rows), batch_size):
+                yield rows[i:i + batch_size]
+
+    with storage.get_pool(dbname).connection() as conn:
+        cursor = conn.execute("""
+            SELECT e.timestamp, t.name, e.modifiers, e.comment
+            FROM baby_events e JOIN event_types t ON t.id = e.type_id ORDER BY e.ts, e.rowid
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(ts, join_event(t, m), c) for ts, t, m, c in rows]
+
+def export_events(path, dbname=storage.DATABASE_NAME, batch_size=BATCH_SIZE):
+    """Writes every event to a .csv or .parquet file with UTC timestamps. Returns the number of rows written."""
+    ext = os.path.splitext(path)[1].lower()
+    written = 0
+    if ext == ".csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in iter_export_batches(dbname, batch_size):
+                writer.writerows((ts, event, comment or "") for ts, event, comment in rows)
+                written += len(rows)
+    elif ext == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([(name, pa.string()) for name in EXPORT_COLUMNS])
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in iter_export_batches(dbname, batch_size):
+                writer.write_table(pa.Table.from_arrays([pa.array(column, pa.string()) for column in zip(*rows)], schema=schema))
+                written += len(rows)
+    else:
+        raise ValueError(f"Unsupported output format: {path} (use .csv or .parquet)")
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk import and export of baby events")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="file to read (.csv, .jsonl, .json) or write (.csv, .parquet)")
+    parser.add_argument("--db", help="database file, defaults to baby_log.db")
+    parser.add_argument("--tenant", help="household whose database to use, instead of --db")
+    parser.add_argument("--timezone", default="UTC", help="zone of imported timestamps that have no offset, e.g. US/Pacific")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    dbname = args.db or storage.database_for(args.tenant)
+    if args.command == "import":
+        imported, duplicates, invalid = import_events(args.path, dbname, pytz.timezone(args.timezone), args.batch_size)
+        print(f"Imported {imported} events into {dbname}, skipped {duplicates} duplicates and {invalid} invalid rows")
+    else:
+        print(f"Exported {export_events(args.path, dbname, args.batch_size)} events from {dbname} to {args.path}")
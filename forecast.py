@@ -0,0 +1,132 @@
+# forecast.py
+# When the next feed or diaper change is due. For every event type the time between one
+# event and the next is tracked as an exponentially weighted mean and variance, per block
+# of hours of the day (nights stretch out), and folded in as each event is written, so a
+# new event costs a few rows however long the history is. storage.py keeps the statistics
+# in the event_intervals and last_events tables, in the same transaction as the events.
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+import math
+
+BUCKET_HOURS = 4            # 0-4, 4-8, ... local time of the earlier event
+ALL_DAY = -1                # the bucket every interval also goes into, used while a block has few samples
+ALPHA = 0.15                # weight of the newest interval, i.e. roughly the last dozen count
+MIN_SAMPLES = 4
+MIN_INTERVAL = 10 * 60      # shorter gaps are the same event logged twice, e.g. both sides of one feed
+MAX_INTERVAL = 24 * 3600    # longer gaps are days nothing was logged
+BAND_Z = 1.28               # the band holds ~80% of intervals if they were normally distributed
+SHOWN_TYPES = ("Breastfeeding", "Diaper Change")
+
+SELECT_LAST = "SELECT type_id, ts FROM last_events WHERE type_id IN ({})"
+SELECT_INTERVALS = "SELECT type_id, bucket, mean, var, samples FROM event_intervals WHERE type_id IN ({})"
+UPSERT_LAST = "INSERT INTO last_events (type_id, ts) VALUES (?, ?) ON CONFLICT (type_id) DO UPDATE SET ts = excluded.ts"
+UPSERT_INTERVALS = """
+    INSERT INTO event_intervals (type_id, bucket, mean, var, samples) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (type_id, bucket) DO UPDATE SET mean = excluded.mean, var = excluded.var, samples = excluded.samples
+"""
+SELECT_LAST_OF_NAME = "SELECT l.type_id, l.ts FROM last_events l JOIN event_types t ON t.id = l.type_id WHERE t.name = ?"
+SELECT_BUCKETS = "SELECT bucket, mean, var, samples FROM event_intervals WHERE type_id = ? AND bucket IN (?, ?)"
+
+Forecast = namedtuple("Forecast", ["last", "due", "early", "late", "samples"])
+
+
+@lru_cache(maxsize=4096)
+def _utc_offsets(utc_day, tz):
+    #the UTC offset in seconds at the first and last second of one UTC day
+    start = utc_day * 86400
+    return tuple(int(datetime.fromtimestamp(t, tz).utcoffset().total_seconds()) for t in (start, start + 86399))
+
+def local_seconds(ts, tz):
+    """A UTC epoch moved to tz's wall clock, for its local day (storage.local_day) or hour.
+
+    The offset is looked up once per UTC day, and again for each event on days the clocks change.
+    """
+    start_offset, end_offset = _utc_offsets(ts // 86400, tz)
+    if start_offset != end_offset:
+        return ts + int(datetime.fromtimestamp(ts, tz).utcoffset().total_seconds())
+    return ts + start_offset
+
+def bucket_of(ts, tz):
+    return local_seconds(ts, tz) % 86400 // 3600 // BUCKET_HOURS
+
+def ewma(stats, interval):
+    """(mean, var, samples) after one more interval; the first few are averaged evenly."""
+    mean, var, samples = stats
+    alpha = max(ALPHA, 1 / (samples + 1))
+    diff = interval - mean
+    return mean + alpha * diff, (1 - alpha) * (var + alpha * diff * diff), samples + 1
+
+def fold(last, intervals, rows, tz):
+    """Folds (ts, type_id, ...) rows, oldest first, into the `last` and `intervals` dicts.
+
+    Returns the keys of `intervals` that changed. A row older than its type's last event
+    can't be placed without the history in between and is skipped.
+    """
+    changed = set()
+    for ts, type_id, *_ in rows:
+        previous = last.get(type_id)
+        if previous is not None and ts < previous:
+            continue
+        last[type_id] = ts
+        if previous is None or not MIN_INTERVAL <= ts - previous <= MAX_INTERVAL:
+            continue
+        for key in ((type_id, bucket_of(previous, tz)), (type_id, ALL_DAY)):
+            intervals[key] = ewma(intervals.get(key, (0.0, 0.0, 0)), ts - previous)
+            changed.add(key)
+    return changed
+
+def record_events(c, rows, tz):
+    """Updates the stored statistics with newly written (ts, type_id, modifiers) rows."""
+    type_ids = sorted({row[1] for row in rows})
+    if not type_ids:
+        return
+    marks = ','.join('?' * len(type_ids))
+    last = dict(c.execute(SELECT_LAST.format(marks), type_ids).fetchall())
+    before = dict(last)
+    intervals = {(t, b): (mean, var, n) for t, b, mean, var, n in c.execute(SELECT_INTERVALS.format(marks), type_ids)}
+    changed = fold(last, intervals, sorted(rows), tz)
+    c.executemany(UPSERT_LAST, [(t, ts) for t, ts in last.items() if before.get(t) != ts])
+    c.executemany(UPSERT_INTERVALS, [key + intervals[key] for key in changed])
+
+def rebuild(c, tz, chunk_size=10000):
+    """Recomputes the statistics from every stored event, oldest first."""
+    last, intervals = {}, {}
+    events = c.connection.execute("SELECT ts, type_id FROM baby_events WHERE type_id IS NOT NULL ORDER BY ts, rowid")
+    while True:
+        rows = events.fetchmany(chunk_size)
+        if not rows:
+            break
+        fold(last, intervals, rows, tz)
+    c.execute("DELETE FROM last_events")
+    c.execute("DELETE FROM event_intervals")
+    c.executemany(UPSERT_LAST, last.items())
+    c.executemany(UPSERT_INTERVALS, [key + value for key, value in intervals.items()])
+
+def predict(conn, event_type, tz):
+    """A Forecast of tz-aware datetimes for the next event_type, or None before there are intervals to go on.
+
+    Uses the block of hours the last event fell in once it has MIN_SAMPLES intervals, the all-day figures before that.
+    """
+    row = conn.execute(SELECT_LAST_OF_NAME, (event_type,)).fetchone()
+    if row is None:
+        return None
+    type_id, last = row
+    bucket = bucket_of(last, tz)
+    stats = {b: (mean, var, n) for b, mean, var, n in conn.execute(SELECT_BUCKETS, (type_id, bucket, ALL_DAY))}
+    if bucket in stats and stats[bucket][2] >= MIN_SAMPLES:
+        mean, var, samples = stats[bucket]
+    elif ALL_DAY in stats:
+        mean, var, samples = stats[ALL_DAY]
+    else:
+        return None
+    spread = BAND_Z * math.sqrt(max(var, 0.0))
+    at = lambda seconds: datetime.fromtimestamp(last + seconds, tz)
+    return Forecast(at(0), at(mean), at(max(mean - spread, MIN_INTERVAL)), at(mean + spread), samples)
+
+def rebase(f, last):
+    """The same forecast counted from a later `last`, e.g. an event that is still being written."""
+    if f is None or last is None or last <= f.last:
+        return f
+    shift = last - f.last
+    return Forecast(last, f.due + shift, f.early + shift, f.late + shift, f.samples)
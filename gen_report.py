@@ -1,16 +1,23 @@
+import os
 import pandas as pd
-import pytz, sqlite3
-from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, date
 import plotly.graph_objects as go
 from fpdf import FPDF
 from io import BytesIO
-import base64
+from storage import DATABASE_NAME, LOCAL_TZ, database_for, load_data, load_daily_counts, next_event
+from forecast import SHOWN_TYPES
+from metrics import compute_metrics, analyze_sleep_durations
+from render_cache import RenderCache, cache_key
+from timing import StageTimer
+
+# Part of every cache key; bump it when the radar plot or the report layout changes
+RENDER_VERSION = 1
+RADAR_WIDTH = 700
+render_cache = RenderCache()
 
 # Assuming you have these functions defined elsewhere:
-# load_data, time_since_last, count_events, create_radar_plot, analyze_sleep_durations_df
-DATABASE_NAME = "baby_log.db"
-PDT = pytz.timezone('US/Pacific')
+# create_radar_plot
 
 def dt_to_hr_mins(time):
     total_seconds = time.total_seconds()
@@ -36,74 +43,11 @@ def format_timestamp_with_day_period(timestamp):
     else:
         return f"{date_str} / Night / {time_str}"
 
-def extract_comment(s, idx=1):
-    if isinstance(s, str) and '+' in s:
-        try:
-            return s.split('+')[idx]
-        except IndexError:
-            return "" # Handles cases where there's no element at index 1
-    else:
-        return s if idx==0 else None   # Handles non-string or no '+' cases
-
-
-def load_data(start_date):
-    conn = sqlite3.connect(DATABASE_NAME)
-    df = pd.read_sql_query("SELECT rowid,timestamp, event FROM baby_events ORDER BY timestamp DESC", conn)
-    conn.close()
-    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize('UTC').dt.tz_convert(PDT)
-    df = df[df['timestamp'].dt.date >= start_date]
-    df['date'] = df['timestamp'].dt.date
-    df['time'] = df['timestamp'].dt.time
-
-    df['comments'] = df['event'].apply(partial(extract_comment,idx=1))
-    df['event'] = df['event'].apply(partial(extract_comment,idx=0))
-
-    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    return df
-
-def time_since_last(df, event_type, start_date):
-
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.date >= start_date] #this is in pdt
-    last_event_df = filtered_df[filtered_df['event'].str.startswith(event_type)]
-    last_event = last_event_df['timestamp'].max()
-
-    if pd.isnull(last_event):
-        return "N/A"
-    else:
-        last_event_dt = PDT.localize(datetime.strptime(last_event, '%Y-%m-%d %H:%M:%S'))
-        now_pdt = datetime.now(PDT)
-        last_event_epoch = int(last_event_dt.timestamp())
-        now_pdt_epoch = int(now_pdt.timestamp())
-        time_diff_seconds = now_pdt_epoch - last_event_epoch
-        time_diff = timedelta(seconds=time_diff_seconds)
-
-        if event_type == "Breastfeeding":
-            #For bf add modifier for side
-            last_event_string = last_event_df[last_event_df['timestamp']==last_event]["event"].iloc[0]
-            last_event_string = last_event_string.split(',')
-            modifier = ''
-            if 'R' in last_event_string:
-                modifier += ":point_right:"
-            if 'L' in last_event_string:
-                modifier += ':point_left:'
-            return str(time_diff), modifier
-        else:
-            return str(time_diff)
-
-def count_events(df, event_type, start_time):
-    #only last 24 hrs not by date
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.tz_localize(PDT) >= start_time]
-    count = len(filtered_df[filtered_df['event'].str.startswith(event_type)])
-    return count
-
-def count_balance(df, start_date):
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.date >= start_date]
-    count = {"L":0, "R":0}
-    for el in filtered_df['event']:
-        if 'L' in el:
-            count['L'] +=1
-        if 'R' in el:
-            count['R'] +=1
+def count_balance(start_date):
+    #reads the daily rollup, so a long range costs one row per day
+    daily = load_daily_counts(start_date)
+    feeds = daily[daily['type'] == "Breastfeeding"]
+    count = {"L": int(feeds['left_side'].sum()), "R": int(feeds['right_side'].sum())}
 
     fig = go.Figure(data=[go.Pie(labels=['left', 'right'], values=[count['L'], count['R']], marker_colors=['blue', 'red'])])
     fig.update_layout(
@@ -118,44 +62,6 @@ def count_balance(df, start_date):
 
     return count, fig
 
-def analyze_sleep_durations(df,start_date):
-    """
-    Analyzes sleep durations from a DataFrame of events.
-
-    Args:
-        df (pd.DataFrame): DataFrame with 'timestamp' and 'event' columns.
-        start_date (datetime.date): Date to start analysis from.
-
-    Returns:
-        list: A list of tuples, where each tuple contains (start_time, duration).
-    """
-
-    df = df.copy()
-    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(PDT)
-    df = df[df['timestamp'].dt.date >= start_date].sort_values(by='timestamp')
-
-    sleep_data = []
-    sleep_start = None
-
-    for index, row in df.iterrows():
-        event = row['event']
-        timestamp = row['timestamp']
-
-        if event.startswith("Sleep"):
-            sleep_start = timestamp
-        elif sleep_start and (event.startswith('Diaper') or event.startswith('Breastfeeding')):
-            sleep_end = timestamp
-            duration = sleep_end - sleep_start
-            sleep_data.append((sleep_start, duration))
-            sleep_start = None  # Reset sleep start
-
-    if sleep_data:
-        sleep_df = pd.DataFrame(sleep_data, columns=['start_time', 'duration'])
-        return sleep_df
-    else:
-        return pd.DataFrame(columns=['start_time', 'duration']) # return empty dataframe if no results.
-
-
 def calculate_average_sleep_duration(sleep_df):
     avg_duration = sleep_df['duration'].mean()
     total_seconds = avg_duration.total_seconds()
@@ -167,10 +73,7 @@ def calculate_average_sleep_duration(sleep_df):
 def create_radar_plot(df,  twenty_four_hours_ago, timestamp_column='timestamp'):
 
     ## Filter only for events in the last 24 hrs.
-    df_filtered = df.copy()
-    ts = pd.to_datetime(df_filtered[timestamp_column]).dt.tz_localize(PDT)
-    # Filter the DataFrame
-    df_filtered = df_filtered[ts >= twenty_four_hours_ago]
+    df_filtered = df[df[timestamp_column] >= twenty_four_hours_ago]
 
     categories = ['Sleep','Breastfeeding', 'Pee', 'Poop']
     colors = ['magenta','brown', 'blue', 'green']
@@ -178,9 +81,9 @@ def create_radar_plot(df,  twenty_four_hours_ago, timestamp_column='timestamp'):
     fig = go.Figure()
 
     idx = 0.5
-    date = df_filtered['date'].iloc[-1]
+    date = df_filtered['date'].iloc[-1] if not df_filtered.empty else twenty_four_hours_ago.date()
     for marker, category, color in zip(markers, categories, colors):
-        filtered_events = df_filtered[df_filtered['event'].str.startswith(category)]
+        filtered_events = df_filtered[df_filtered['type'] == category]
         times = [(t.hour + t.minute / 60)*360/24 for t in filtered_events['time']]
         dates = [1 if d==date else 0 for d in filtered_events['date']]
         comments = [a if a else "" for a in filtered_events['comments']]
@@ -213,8 +116,37 @@ def create_radar_plot(df,  twenty_four_hours_ago, timestamp_column='timestamp'):
 
 ### END OF function copy
 
-def generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago):
-    """Generates a PDF report using FPDF."""
+def events_digest(df):
+    #what the report shows of each event, hashed in one vectorized pass
+    columns = df[['rowid', 'timestamp', 'type', 'modifiers', 'comments']].astype(str)
+    return pd.util.hash_pandas_object(columns, index=False).to_numpy().tobytes()
+
+def radar_png(df, twenty_four_hours_ago):
+    """The report's radar plot as PNG bytes, rendered only if these events weren't drawn before."""
+    in_window = df[df['timestamp'] >= twenty_four_hours_ago]
+    key = cache_key("radar", RENDER_VERSION, RADAR_WIDTH, events_digest(in_window), twenty_four_hours_ago.date())
+    return render_cache.get_or_create(
+        key, lambda: create_radar_plot(in_window, twenty_four_hours_ago).to_image(format="png", width=RADAR_WIDTH), ".png")
+
+def start_renderer():
+    """Keeps one headless browser running for this process's fig.to_image calls.
+
+    Kaleido >= 1.0 otherwise launches a browser for every image; older Kaleido
+    already keeps its renderer alive between calls.
+    """
+    try:
+        import kaleido
+    except ImportError:
+        return
+    if hasattr(kaleido, "start_sync_server"):
+        kaleido.start_sync_server(silence_warnings=True)
+
+def generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago, now=None, timer=None, forecasts=None):
+    """Generates a PDF report using FPDF. `now` is the time the report is as of, the current time by default.
+
+    forecasts maps event types to the forecast.Forecast of their next event, shown below the counts.
+    """
+    timer = timer or StageTimer("report", enabled=False)
 
     pdf = FPDF()
     pdf.add_page()
@@ -225,25 +157,24 @@ def generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago):
     pdf.ln(10)
 
 
-    sleep_time=time_since_last(df, 'Sleep', start_date)
-    feeding_time=time_since_last(df, 'Breastfeeding', start_date)[0]
-    diaper_time=time_since_last(df, 'Diaper Change', start_date)
-
-    if sleep_time>feeding_time or sleep_time>diaper_time:
-        sleep_time="N/A"
+    with timer.stage("metrics"):
+        metrics = compute_metrics(df, {'24h': twenty_four_hours_ago}, now=now)
 
     # Table Data
     table_data = [
-        ["Current Time (PDT)", datetime.now(PDT).strftime('%Y-%m-%d %H:%M:%S %Z')],
-        ["Time since last diaper change", time_since_last(df, 'Diaper Change', start_date)],
-        ["Time since last feeding", time_since_last(df, 'Breastfeeding', start_date)[0]],
-        ["Time since sleep", sleep_time],
-        ["Time since last pain med", time_since_last(df, 'Mom Painmeds', start_date)],
-        ["Time since last Vitamin D", time_since_last(df, 'Vitamin D', start_date)],
-        ["Time since last Prenatal vitamins", time_since_last(df, 'Prenatal vitamins', start_date)],
-        ["Pee count", count_events(df, 'Pee',  twenty_four_hours_ago)],
-        ["Poop count", count_events(df, 'Poop', twenty_four_hours_ago)],
+        ["Current Time", metrics.now.strftime('%Y-%m-%d %H:%M:%S %Z')],
+        ["Time since last diaper change", metrics.time_since('Diaper Change')],
+        ["Time since last feeding", metrics.time_since('Breastfeeding')],
+        ["Time since sleep", metrics.sleep_time_since()],
+        ["Time since last pain med", metrics.time_since('Mom Painmeds')],
+        ["Time since last Vitamin D", metrics.time_since('Vitamin D')],
+        ["Time since last Prenatal vitamins", metrics.time_since('Prenatal vitamins')],
+        ["Pee count", metrics.count('Pee', '24h')],
+        ["Poop count", metrics.count('Poop', '24h')],
     ]
+    for event_type, f in (forecasts or {}).items():
+        if f is not None:
+            table_data.append([f"Next {event_type} expected", f"{f.due:%H:%M} (likely {f.early:%H:%M}-{f.late:%H:%M})"])
 
     # Create Table
     col_width = pdf.w / 2.1 # adjust as needed.
@@ -258,7 +189,8 @@ def generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago):
     pdf.set_font("Arial", 'B', 14)
     pdf.cell(0, 10, "Sleep Data", 0, 1)
     pdf.set_font("Arial", "", 12)
-    sleep_df = analyze_sleep_durations(df, start_date)
+    with timer.stage("sleep analysis"):
+        sleep_df = analyze_sleep_durations(df, start_date)
 
     avg_duration = sleep_df['duration'].median()
     max_duration = sleep_df['duration'].max()
@@ -281,28 +213,98 @@ def generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago):
     pdf.set_font("Arial", 'B', 14)
     pdf.cell(0, 10, "Activity Radar Plot", 0, 1)
 
-    fig = create_radar_plot(df, twenty_four_hours_ago)
-    img_data = fig.to_image(format="png")
-    img_base64 = base64.b64encode(img_data).decode("utf-8")
-    img_io = BytesIO(base64.b64decode(img_base64))
-
-    pdf.image(img_io, w=150)
+    #BytesIO shares the PNG bytes rather than copying them
+    with timer.stage("radar plot"):
+        png = radar_png(df, twenty_four_hours_ago)
+    pdf.image(BytesIO(png), w=150)
 
-    return pdf.output(dest='S')
+    with timer.stage("pdf"):
+        return pdf.output(dest='S')
 
-def do_report():
+def report_pdf(dbname=DATABASE_NAME, day=None, timer=None):
+    """The report for the 24 hours up to the end of `day`, or up to now if no day is given, as PDF bytes.
 
-    yesterday = date.today() - timedelta(days=1)
-    start_date = yesterday
+    A past day's report is served from the render cache until one of its events changes.
+    """
 
     # Get the current time, and subtract 24 hours
-    now = datetime.now(PDT)
+    now = datetime.now(LOCAL_TZ)
+    day_over = False
+    if day is not None:
+        end_of_day = LOCAL_TZ.localize(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+        day_over = end_of_day <= now
+        now = min(now, end_of_day)
     twenty_four_hours_ago = now - timedelta(hours=24)
+    start_date = now.date() - timedelta(days=1)
+
+    timer = timer or StageTimer("report", enabled=False)
+    timer.record(dbname=dbname, day=day)
+    with timer.stage("load"):
+        df = load_data(start_date, dbname=dbname)
+        if day is not None:
+            df = df[df['timestamp'] < now]
+    if not day_over:
+        #"time since" changes every second until the day is over, so there is nothing to reuse
+        with timer.stage("forecast"):
+            forecasts = {event_type: next_event(event_type, dbname=dbname) for event_type in SHOWN_TYPES}
+        return bytes(generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago, now=now, timer=timer,
+                                              forecasts=forecasts))
+    key = cache_key("report", RENDER_VERSION, events_digest(df), start_date, twenty_four_hours_ago, now)
+    return render_cache.get_or_create(
+        key, lambda: generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago, now=now, timer=timer), ".pdf")
+
+def do_report(dbname=DATABASE_NAME, output="report.pdf", day=None, show_timings=False):
+    """Writes report_pdf(dbname, day) to output."""
+    timer = StageTimer("report", enabled=show_timings)
+    report_pdf_fpdf = report_pdf(dbname, day, timer)
+    with timer.stage("write"):
+        with open(output, "wb") as f:
+            f.write(report_pdf_fpdf)
+    timings = timer.finish()
+    if show_timings:
+        print(f"{output}: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in timings.items()))
+    return output
+
+def _do_report_job(job):
+    return do_report(*job)
+
+def do_reports(jobs, workers=None):
+    """Writes many reports in parallel, e.g. every day of a month for every household.
 
-    df = load_data(start_date)
-    report_pdf_fpdf = generate_pdf_report_fpdf(df, start_date, twenty_four_hours_ago)
-    with open("report.pdf", "wb") as f:
-        f.write(report_pdf_fpdf)
+    Args:
+        jobs (list): (dbname, output, day) tuples, as taken by do_report.
+        workers (int): worker processes, defaults to one per CPU. Each keeps its own
+            renderer running for all the reports it draws.
+
+    Returns:
+        list: the paths written, in the order of `jobs`.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=start_renderer) as pool:
+        return list(pool.map(_do_report_job, jobs))
 
 if __name__ == '__main__':
-    do_report()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Writes PDF reports of the last day, or of every day in a range")
+    parser.add_argument("--tenant", action="append", help="household to report on, can be repeated; defaults to baby_log.db")
+    parser.add_argument("--output", default="report.pdf", help="file for a single report")
+    parser.add_argument("--day", type=date.fromisoformat, help="report on the day ending at midnight after DAY (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, help="report on each of the DAYS days up to --day (or today), in parallel")
+    parser.add_argument("--output-dir", default="reports", help="where batch reports go, as <tenant>/<day>.pdf")
+    parser.add_argument("--workers", type=int, help="worker processes for --days, defaults to one per CPU")
+    parser.add_argument("--timings", action="store_true", help="print how long each stage of a single report took")
+    args = parser.parse_args()
+
+    tenants = args.tenant or [None]
+    if args.days is None and len(tenants) == 1:
+        start_renderer()
+        do_report(database_for(tenants[0]), args.output, args.day, args.timings)
+    else:
+        last_day = args.day or datetime.now(LOCAL_TZ).date()
+        jobs = []
+        for tenant in tenants:
+            os.makedirs(os.path.join(args.output_dir, tenant or "default"), exist_ok=True)
+            for i in range(args.days or 1):
+                day = last_day - timedelta(days=i)
+                jobs.append((database_for(tenant), os.path.join(args.output_dir, tenant or "default", f"{day}.pdf"), day))
+        for path in do_reports(jobs, args.workers):
+            print(f"Wrote {path}")
\ No newline at end of file
@@ -1,158 +1,164 @@
 import paho.mqtt.client as mqtt
 import json
-import sqlite3
-from datetime import datetime, timedelta, date
-from functools import partial
-import pytz
-import pandas as pd
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
 from config import *
+import config
+import storage
+from storage import LOCAL_TZ, create_table
+from write_queue import WriteQueue, DUPLICATE
+from timing import StageTimer
 
 # MQTT topic to subscribe to
 MQTT_TOPIC = f"{ADAFRUIT_IO_USERNAME}/feeds/{ADAFRUIT_IO_FEED}"
+# Optional TENANT_FEEDS = {"smith": "baby-smith", ...} in config.py gives each household
+# its own feed and database; ADAFRUIT_IO_FEED keeps writing to baby_log.db
+TENANT_FEEDS = getattr(config, "TENANT_FEEDS", {})
+TOPIC_DATABASES = {MQTT_TOPIC: storage.DATABASE_NAME}
+TOPIC_DATABASES.update({f"{ADAFRUIT_IO_USERNAME}/feeds/{feed}": storage.database_for(tenant)
+                        for tenant, feed in TENANT_FEEDS.items()})
 MQTT_BROKER_URL = "io.adafruit.com"
 MQTT_BROKER_PORT = 1883
-
-## DB details
-DATABASE_NAME = "baby_log.db"
-PDT = pytz.timezone('US/Pacific')
+# A fixed client id with clean_session=False makes the broker keep this client's session while it
+# is down: QoS 1 messages not acknowledged yet are delivered again when it reconnects.
+# Only one broker process may run per client id; set MQTT_CLIENT_ID in config.py to run another.
+MQTT_CLIENT_ID = getattr(config, "MQTT_CLIENT_ID", f"baby-tracker-{ADAFRUIT_IO_USERNAME}")
+# The id of the broker session messages arrived in, kept across restarts while the session lasts
+SESSION_FILE = os.path.splitext(storage.DATABASE_NAME)[0] + "_mqtt_session"
 
 ## define all functions for database manipulation
-def create_table(dbname=DATABASE_NAME):
-    conn = sqlite3.connect(dbname)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS baby_events (
-            timestamp TEXT,
-            event TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def log_event(event, comments=""):
-    now_utc = datetime.utcnow()
-    now_str = now_utc.strftime("%Y-%m-%d %H:%M:%S")
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    if comments:
-        event=f"{event}+{comments}"
-    c.execute("INSERT INTO baby_events (timestamp, event) VALUES (?, ?)", (now_str, event))
-    conn.commit()
-    conn.close()
-    print(f"Logged: {event} at {now_utc.astimezone(PDT).strftime('%Y-%m-%d %H:%M:%S')} PDT")
-
-def update_logs(df_edited):
-    try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
-        for index, row in df_edited.iterrows():
-            # st.markdown(edited_df)
-            combined_datetime = PDT.localize(datetime.combine(row['date'], row['time']))
-            combined_datetime_utc = combined_datetime.astimezone(pytz.utc).strftime('%Y-%m-%d %H:%M:%S')
-            if row['comments']:
-                combined_event_comment = f"{row['event']}+{row['comments']}"
-            else:
-                combined_event_comment =  row["event"]
-
-            c.execute("UPDATE baby_events SET timestamp = ?, event = ? WHERE rowid = ?", (combined_datetime_utc, combined_event_comment, row['rowid']))
-        conn.commit()
-        conn.close()
-    except ValueError:
-        st.error("Invalid timestamp format.")
-
-def load_data(start_date):
-    def extract_comment(s, idx=1):
-        if isinstance(s, str) and '+' in s:
-            try:
-                return s.split('+')[idx]
-            except IndexError:
-                return "" # Handles cases where there's no element at index 1
-        else:
-            return s if idx==0 else None   # Handles non-string or no '+' cases
-
-    conn = sqlite3.connect(DATABASE_NAME)
-    df = pd.read_sql_query("SELECT rowid,timestamp, event FROM baby_events ORDER BY timestamp DESC", conn)
-    conn.close()
-    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize('UTC').dt.tz_convert(PDT)
-    df = df[df['timestamp'].dt.date >= start_date]
-    df['date'] = df['timestamp'].dt.date
-    df['time'] = df['timestamp'].dt.time
-
-    df['comments'] = df['event'].apply(partial(extract_comment,idx=1))
-    df['event'] = df['event'].apply(partial(extract_comment,idx=0))
-
-    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    return df
-
-def time_since_last(df, event_type, start_date):
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.date >= start_date] #this is in pdt
-    last_event_df = filtered_df[filtered_df['event'].str.startswith(event_type)]
-    last_event = last_event_df['timestamp'].max()
-
-    if pd.isnull(last_event):
-        return "N/A"
-    else:
-        last_event_dt = PDT.localize(datetime.strptime(last_event, '%Y-%m-%d %H:%M:%S'))
-        now_pdt = datetime.now(PDT)
-        last_event_epoch = int(last_event_dt.timestamp())
-        now_pdt_epoch = int(now_pdt.timestamp())
-        time_diff_seconds = now_pdt_epoch - last_event_epoch
-        time_diff = timedelta(seconds=time_diff_seconds)
-
-        return time_diff
-
-
-def add_time_to_last_event(df, time_to_add, start_date, event_type="Breastfeeding"):
-    filtered_df = df[pd.to_datetime(df['timestamp']).dt.date >= start_date] #this is in pdt
-    last_event_df = filtered_df[filtered_df['event'].str.startswith(event_type)]
-    last_event = last_event_df['timestamp'].max()
-
-    if pd.isnull(last_event):
-        return "N/A"
-    else:
-        comment = f"Lasted {time_to_add}"
-        edited_df = last_event_df[last_event_df['timestamp']==last_event]
-        edited_df["comments"] = comment
-
-        update_logs(edited_df)
+# Writes are queued and committed by the writer thread, never on paho's network thread
+def print_commit(batch_size, commit_ms):
+    stats = writer.stats()
+    print(f"Committed {batch_size} message(s) in {commit_ms:.1f} ms (queue depth {stats['queue_depth']}, duplicates {stats['duplicates']})")
+    #with BABY_TIMING_LOG set, commits are logged next to the on_message timings
+    timer = StageTimer("broker-commit", enabled=False)
+    timer.add("commit", commit_ms)
+    timer.record(batch_size=batch_size, queue_depth=stats['queue_depth'])
+    timer.finish()
+
+writer = WriteQueue(on_commit=print_commit)
+# Packet ids are only unique among a session's messages in flight and start over with a new
+# session, so message keys include the session they arrived in
+session_id = None
+
+def current_session(session_present):
+    """The id of the broker session: the saved one if the broker resumed it, else a new one."""
+    if session_present:
+        try:
+            with open(SESSION_FILE) as f:
+                return f.read().strip()
+        except OSError:
+            pass
+    new_id = uuid.uuid4().hex
+    with open(SESSION_FILE, "w") as f:
+        f.write(new_id)
+    return new_id
+
+def message_key(msg):
+    #QoS 0 messages are never redelivered, and all share mid 0
+    if msg.qos == 0:
+        return None
+    return f"{session_id}:{msg.topic}:{msg.mid}:{hashlib.sha1(msg.payload).hexdigest()}"
+
+def acknowledged(client, msg, then=None):
+    #on_done for a queued message: the PUBACK goes out once the write is committed (or was a redelivery),
+    #so a crash with writes still queued leaves the message to the broker to send again
+    def done(result):
+        client.ack(msg.mid, msg.qos)
+        if then is not None and result is not DUPLICATE:
+            then(result)
+    return done
+
+def log_events(events, key=None, dbname=None, ack=None):
+    #events is a list of (event, comments), written in one transaction
+    received = storage.utc_now()
+    def logged(now_utc):
+        for event, comments in events:
+            if comments:
+                event=f"{event}+{comments}"
+            print(f"Logged: {event} at {now_utc.astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    on_done = ack(logged) if ack else logged
+    on_error = ack(lambda e: print(f"Write failed: {e}")) if ack else None
+    if not writer.submit(lambda c: storage.write_events(c, events, received), key=key, on_done=on_done,
+                         on_error=on_error, dbname=dbname):
+        #left unacknowledged, so the broker delivers it again after the next reconnect
+        print(f"Write queue full, dropped: {events}")
+
+def log_event(event, comments="", key=None, dbname=None, ack=None):
+    log_events([(event, comments)], key=key, dbname=dbname, ack=ack)
+
+def set_last_event_duration(event_type, start_date, key=None, dbname=None, ack=None):
+    received = storage.utc_now()
+    def logged(lasted):
+        print(start_date, lasted)
+        print(f"Logged: Stop Feeding at {received.astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    on_done = ack(logged) if ack else logged
+    on_error = ack(lambda e: print(f"Write failed: {e}")) if ack else None
+    if not writer.submit(lambda c: storage.write_last_event_duration(c, event_type, start_date, received), key=key,
+                         on_done=on_done, on_error=on_error, dbname=dbname):
+        print(f"Write queue full, dropped: Stop Feeding")
 
 
 # Callback function for when the client connects to the MQTT broker
-def on_connect(client, userdata, flags, rc):
-    if rc == 0:
+def on_connect(client, userdata, flags, reason_code, properties):
+    global session_id
+    if not reason_code.is_failure:
+        session_id = current_session(flags.session_present)
         print(f"Connected to Adafruit IO MQTT broker at {MQTT_BROKER_URL}:{MQTT_BROKER_PORT}")
-        client.subscribe(MQTT_TOPIC)
-        print(f"Subscribed to feed: {MQTT_TOPIC}")
+        for topic in TOPIC_DATABASES:
+            client.subscribe(topic, qos=1)
+            print(f"Subscribed to feed: {topic}")
     else:
-        print(f"Failed to connect to MQTT broker with result code {rc}")
+        print(f"Failed to connect to MQTT broker: {reason_code}")
 
 # Callback function for when a message is received on the subscribed topic
 def on_message(client, userdata, msg):
+    #timed only when BABY_TIMING_LOG is set
+    timer = StageTimer("broker", enabled=False)
+    queued = False
+    ack = lambda then: acknowledged(client, msg, then)
     try:
-        payload = msg.payload.decode("utf-8")
-        if payload == "Feeding":
-            log_event("Breastfeeding")
-        elif payload=="Diaper":
-            log_event("Diaper Change")
-            log_event("Pee")
-        elif payload=="Stop Feeding":
-            start_date = date.today() - timedelta(days=1)
-            df = load_data(start_date)
-            time_to_update = time_since_last(df, "Breastfeeding", start_date)
-            print(start_date, time_to_update)
-            add_time_to_last_event(df, time_to_update, start_date)
-
-            now_utc = datetime.utcnow()
-            now_str = now_utc.strftime("%Y-%m-%d %H:%M:%S")
-            print(f"Logged: {payload} at {now_utc.astimezone(PDT).strftime('%Y-%m-%d %H:%M:%S')} PDT")
+        with timer.stage("parse"):
+            dbname = TOPIC_DATABASES.get(msg.topic)
+            if dbname is None:
+                print(f"Ignoring message on unknown feed: {msg.topic}")
+                return
+            payload = msg.payload.decode("utf-8")
+            key = message_key(msg)
+        timer.record(topic=msg.topic, payload=payload)
+        with timer.stage("enqueue"):
+            if payload == "Feeding":
+                log_event("Breastfeeding", key=key, dbname=dbname, ack=ack)
+                queued = True
+            elif payload=="Diaper":
+                log_events([("Diaper Change", ""), ("Pee", "")], key=key, dbname=dbname, ack=ack)
+                queued = True
+            elif payload=="Stop Feeding":
+                start_date = datetime.now(LOCAL_TZ).date() - timedelta(days=1)
+                set_last_event_duration("Breastfeeding", start_date, key=key, dbname=dbname, ack=ack)
+                queued = True
 
     except Exception as e:
         print(f"Error processing message: {e}")
+    finally:
+        if not queued:
+            #nothing will be written, e.g. an unknown feed or payload
+            client.ack(msg.mid, msg.qos)
+        timer.finish()
 
 
 if __name__ == '__main__':
+    for dbname in set(TOPIC_DATABASES.values()):
+        create_table(dbname)
+    writer.start()
+
     # Create an MQTT client instance
-    client = mqtt.Client()
+    # Messages are acknowledged by the writer thread once they are stored, see acknowledged()
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=MQTT_CLIENT_ID, clean_session=False,
+                         manual_ack=True)
 
     # Set the username and password for Adafruit IO
     client.username_pw_set(ADAFRUIT_IO_USERNAME, ADAFRUIT_IO_KEY)
@@ -0,0 +1,185 @@
+# metrics.py
+# The "time since last" and count numbers shown by the dashboard and the PDF report,
+# computed for every event type in one pass over the event window.
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from storage import LOCAL_TZ
+
+
+class MetricsSnapshot:
+    """Last occurrence and windowed counts per event type, as of `now`."""
+
+    def __init__(self, last, counts, now):
+        self.last = last        # indexed by type: ts and modifiers of the latest event
+        self.counts = counts    # indexed by type, one column per count window
+        self.now = now
+
+    def time_since(self, event_type):
+        if event_type not in self.last.index:
+            return "N/A"
+        last_event_epoch = int(self.last.at[event_type, 'ts'].timestamp())
+        return timedelta(seconds=int(self.now.timestamp()) - last_event_epoch)
+
+    def feeding_side(self, event_type="Breastfeeding"):
+        #emoji for the side(s) of the last feed
+        if event_type not in self.last.index:
+            return ""
+        last_modifiers = self.last.at[event_type, 'modifiers'].split(',')
+        modifier = ''
+        if 'R' in last_modifiers:
+            modifier += ":point_right:"
+        if 'L' in last_modifiers:
+            modifier += ':point_left:'
+        return modifier
+
+    def count(self, event_type, window):
+        if event_type not in self.counts.index:
+            return 0
+        return int(self.counts.at[event_type, window])
+
+    def sleep_time_since(self):
+        #only an ongoing sleep counts, i.e. nothing was fed or changed after it
+        last_time = self.time_since("Sleep")
+        others = [self.time_since("Diaper Change"), self.time_since("Breastfeeding")]
+        if last_time != "N/A" and all(a != "N/A" and last_time < a for a in others):
+            return last_time
+        return "N/A"
+
+
+def compute_metrics(df, windows, now=None):
+    """Builds a MetricsSnapshot from an event window.
+
+    Args:
+        df (pd.DataFrame): events from load_data, already limited to the shown dates.
+        windows (dict): count window name -> tz-aware start time, e.g. {'24h': now - 24h}.
+        now (datetime): reference time for "time since", defaults to the current time.
+    """
+    now = now or datetime.now(LOCAL_TZ)
+    events = pd.DataFrame({
+        'type': df['type'],
+        'ts': df['timestamp'],
+        'modifiers': df['modifiers'],
+    })
+    by_type = events.groupby('type', observed=True)
+
+    last = events.loc[by_type['ts'].idxmax().values].set_index('type')
+    in_window = pd.DataFrame({name: events['ts'] >= since for name, since in windows.items()}, index=events.index)
+    counts = in_window.groupby(events['type'], observed=True).sum()
+    return MetricsSnapshot(last, counts, now)
+
+SLEEP_ENDERS = ("Diaper Change", "Breastfeeding")
+
+def analyze_sleep_durations(df, start_date):
+    """
+    Analyzes sleep durations from a DataFrame of events.
+
+    A sleep lasts from a Sleep event to the next Diaper Change or Breastfeeding;
+    if Sleep is logged twice in a row the later one counts.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'rowid', 'timestamp' and 'type' columns.
+        start_date (datetime.date): Date to start analysis from.
+
+    Returns:
+        pd.DataFrame: one row per sleep with 'start_time' and 'duration' columns.
+    """
+    ts = df['timestamp']
+    relevant = (ts >= pd.Timestamp(start_date).tz_localize(LOCAL_TZ)) & df['type'].isin(("Sleep",) + SLEEP_ENDERS)
+    # Events logged in the same second keep the order they were written in
+    events = pd.DataFrame({'ts': ts[relevant], 'rowid': df.loc[relevant, 'rowid'], 'type': df.loc[relevant, 'type']})
+    events = events.sort_values(['ts', 'rowid'])
+
+    # Once Sleep and the enders are all that's left, a sleep ends at every ender whose previous row is a Sleep
+    is_sleep = (events['type'] == "Sleep").to_numpy()
+    prev_is_sleep = np.concatenate(([False], is_sleep[:-1]))
+    ends = ~is_sleep & prev_is_sleep
+    starts = np.roll(ends, -1)
+
+    start_time = events['ts'][starts].reset_index(drop=True)
+    end_time = events['ts'][ends].reset_index(drop=True)
+    if start_time.empty:
+        return pd.DataFrame(columns=['start_time', 'duration']) # return empty dataframe if no results.
+    return pd.DataFrame({'start_time': start_time, 'duration': end_time - start_time})
+
+
+TREND_COLUMNS = {
+    "Feeds": "Breastfeeding",
+    "Diaper changes": "Diaper Change",
+    "Pee": "Pee",
+    "Poop": "Poop",
+}
+
+def trend_frequency(start_date, end_date):
+    #bin size that keeps every trend line to a few hundred points at most
+    days = (end_date - start_date).days + 1
+    if days <= 180:
+        return 'D'
+    if days <= 3 * 365:
+        return 'W'
+    return 'MS'
+
+def history_trends(daily_counts, sleep_df, start_date, end_date):
+    """Per-day averages of feeds, diapers and sleep hours, binned by trend_frequency.
+
+    Args:
+        daily_counts (pd.DataFrame): rows from storage.load_daily_counts.
+        sleep_df (pd.DataFrame): sessions from analyze_sleep_durations.
+
+    Returns:
+        pd.DataFrame: one row per bin, indexed by the bin's first day.
+    """
+    days = pd.date_range(start_date, end_date, freq='D')
+    counts = daily_counts.pivot_table(index='day', columns='type', values='events', aggfunc='sum', observed=True)
+    counts.index = pd.to_datetime(counts.index)
+    counts = counts.reindex(days, fill_value=0).fillna(0)
+
+    per_day = pd.DataFrame(index=days)
+    for column, event_type in TREND_COLUMNS.items():
+        per_day[column] = counts[event_type] if event_type in counts else 0
+
+    if sleep_df.empty:
+        per_day["Sleep (h)"] = 0.0
+    else:
+        sleep_day = pd.to_datetime(sleep_df['start_time']).dt.tz_localize(None).dt.normalize()
+        sleep_hours = pd.to_timedelta(sleep_df['duration']).dt.total_seconds() / 3600
+        per_day["Sleep (h)"] = sleep_hours.groupby(sleep_day.to_numpy()).sum().reindex(days, fill_value=0)
+
+    return per_day.resample(trend_frequency(start_date, end_date)).mean()
+
+
+CIRCADIAN_TYPES = ("Sleep", "Breastfeeding", "Pee", "Poop")
+SECONDS_PER_DAY = 24 * 3600
+
+def circadian_positions(df, first_day, days, types=CIRCADIAN_TYPES):
+    """Where each event falls on a 24-hour clock, one ring per day.
+
+    Args:
+        df (pd.DataFrame): events from load_data.
+        first_day (datetime.date): the day of ring 0.
+        days (int): number of rings; later events are left out.
+
+    Returns:
+        pd.DataFrame: 'day' (ring, 0 = first_day), 'angle' (degrees clockwise from midnight),
+        'hour', 'type', 'timestamp' and 'comments' for each event of `types` in range.
+    """
+    # Local wall-clock seconds: dropping the zone keeps the local time of day
+    wall = df['timestamp'].dt.tz_localize(None).to_numpy().astype('datetime64[s]').astype(np.int64)
+    day = wall // SECONDS_PER_DAY - np.datetime64(first_day, 'D').astype(np.int64)
+    seconds = wall % SECONDS_PER_DAY
+    keep = (day >= 0) & (day < days) & df['type'].isin(types).to_numpy()
+    return pd.DataFrame({
+        'day': day[keep],
+        'angle': seconds[keep] * (360 / SECONDS_PER_DAY),
+        'hour': seconds[keep] // 3600,
+        'type': df['type'].to_numpy()[keep],
+        'timestamp': df['timestamp'].array[keep],
+        'comments': df['comments'].fillna('').astype(str).array[keep],
+    })
+
+def hourly_counts(positions, days, event_type):
+    """days x 24 array of how many `event_type` events fell in each hour of each day."""
+    p = positions[positions['type'] == event_type]
+    cells = p['day'].to_numpy() * 24 + p['hour'].to_numpy()
+    return np.bincount(cells, minlength=days * 24).reshape(days, 24)
+
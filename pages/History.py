@@ -0,0 +1,122 @@
+# pages/History.py
+# Long-range trends. Everything is aggregated into at most a few hundred bins
+# before it reaches Plotly, however long the chosen range is.
+import streamlit as st
+from datetime import datetime, timedelta
+import pandas as pd
+import plotly.graph_objects as go
+import storage
+from storage import LOCAL_TZ, load_daily_counts, load_data
+from metrics import analyze_sleep_durations, history_trends, trend_frequency, SLEEP_ENDERS
+from metrics import circadian_positions, hourly_counts, CIRCADIAN_TYPES
+
+FREQUENCY_LABELS = {'D': 'daily', 'W': 'weekly', 'MS': 'monthly'}
+# WebGL markers only come in a few shapes, so these differ from the dashboard's radar plot
+RHYTHM_STYLES = {
+    "Sleep": ('magenta', 'diamond'),
+    "Breastfeeding": ('brown', 'circle'),
+    "Pee": ('blue', 'square'),
+    "Poop": ('green', 'x'),
+}
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_trends(start_date, end_date, token, dbname):
+    #token is storage.change_token(), so a new event anywhere misses the cache
+    daily = load_daily_counts(start_date, end_date, dbname=dbname)
+    #a sleep that starts on end_date can end the next morning
+    events = load_data(start_date, types=("Sleep",) + SLEEP_ENDERS, dbname=dbname, end_date=end_date + timedelta(days=1))
+    sleep_df = analyze_sleep_durations(events, start_date)
+    if not sleep_df.empty:
+        sleep_df = sleep_df[sleep_df['start_time'] < pd.Timestamp(end_date + timedelta(days=1)).tz_localize(LOCAL_TZ)]
+    return history_trends(daily, sleep_df, start_date, end_date)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_rhythm(first_day, days, token, dbname):
+    events = load_data(first_day, types=CIRCADIAN_TYPES, dbname=dbname, end_date=first_day + timedelta(days=days - 1))
+    return circadian_positions(events, first_day, days)
+
+def rhythm_figure(positions, first_day, days):
+    #one ring per day, oldest innermost; one WebGL trace per event type however many days are shown
+    fig = go.Figure()
+    for offset, (event_type, (color, marker)) in enumerate(RHYTHM_STYLES.items()):
+        p = positions[positions['type'] == event_type]
+        fig.add_trace(go.Scatterpolargl(
+            r=p['day'].to_numpy() + 1 + 0.15 * offset,
+            theta=p['angle'].to_numpy(),
+            mode='markers',
+            customdata=(p['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S') + ' ' + p['comments']).to_numpy(),
+            marker=dict(symbol=marker, color=color, size=6),
+            name=event_type,
+            hovertemplate="%{customdata}<extra></extra>",
+        ))
+    label_every = max(1, days // 7)
+    ring_days = range(days - 1, -1, -label_every)
+    fig.update_layout(
+        polar=dict(
+            radialaxis=dict(range=[0, days + 1], tickvals=[d + 1 for d in ring_days],
+                            ticktext=[str(first_day + timedelta(days=d)) for d in ring_days], showline=False),
+            angularaxis=dict(
+                tickmode='array',
+                tickvals=list(range(0, 360, 15)),
+                ticktext=[f"{i:02d}:00" for i in range(24)],
+                direction='clockwise',
+                rotation=90,
+            ),
+        ),
+        height=650,
+        title=f"Daily rhythm, {first_day} to {first_day + timedelta(days=days - 1)}",
+    )
+    return fig
+
+def heatmap_figure(positions, first_day, days, event_type):
+    counts = hourly_counts(positions, days, event_type)
+    fig = go.Figure(go.Heatmap(
+        z=counts,
+        x=[f"{h:02d}:00" for h in range(24)],
+        y=[str(first_day + timedelta(days=d)) for d in range(days)],
+        colorscale='Blues',
+        hovertemplate="%{y} %{x}: %{z}<extra></extra>",
+    ))
+    fig.update_layout(title=f"{event_type} per hour", yaxis=dict(autorange='reversed'))
+    return fig
+
+def trend_figure(trends, columns, title):
+    fig = go.Figure()
+    for column in columns:
+        fig.add_trace(go.Scatter(x=trends.index, y=trends[column].round(1), mode='lines+markers', name=column))
+    fig.update_layout(title=title, hovermode='x unified')
+    return fig
+
+
+def main():
+    st.title("📈 History")
+    try:
+        dbname = storage.database_for(st.query_params.get("tenant"))
+    except ValueError as e:
+        st.error(str(e))
+        return
+    today = datetime.now(LOCAL_TZ).date()
+    start_date = st.sidebar.date_input("From:", today - timedelta(days=90))
+    end_date = st.sidebar.date_input("To:", today)
+    if start_date > end_date:
+        st.error("'From' must be before 'To'.")
+        return
+
+    trends = load_trends(start_date, end_date, storage.change_token(dbname), dbname)
+    st.caption(f"Averages per day, {FREQUENCY_LABELS[trend_frequency(start_date, end_date)]} bins")
+
+    st.plotly_chart(trend_figure(trends, ["Feeds", "Diaper changes", "Pee", "Poop"], "Feeds and diapers per day"))
+    st.plotly_chart(trend_figure(trends, ["Sleep (h)"], "Sleep hours per day"))
+
+    st.subheader("Daily rhythm")
+    days = st.segmented_control("Days up to 'To'", [7, 14, 30], default=7) or 7
+    first_day = end_date - timedelta(days=days - 1)
+    positions = load_rhythm(first_day, days, storage.change_token(dbname), dbname)
+    st.plotly_chart(rhythm_figure(positions, first_day, days))
+    event_type = st.selectbox("Heatmap of:", CIRCADIAN_TYPES, index=1)
+    st.plotly_chart(heatmap_figure(positions, first_day, days, event_type))
+
+
+if __name__ == "__main__":
+    main()
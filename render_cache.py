@@ -0,0 +1,87 @@
+# render_cache.py
+# On-disk cache for rendered images and report PDFs. Entries are named by a hash of
+# everything that went into the render, so a hit is always safe to serve, and the
+# least recently used files are removed once the directory grows past its size limit.
+import hashlib
+import os
+import tempfile
+import threading
+
+CACHE_DIR = os.environ.get("BABY_CACHE_DIR", os.path.join(".cache", "renders"))
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+
+def cache_key(*parts):
+    """Hex digest of the parts; bytes are hashed as-is, anything else through str()."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class RenderCache:
+    """Size-bounded LRU of byte blobs in a directory, shared by every process using it."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get(self, key, suffix=""):
+        path = self._path(key, suffix)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)    # mtime is the last use, which is what eviction goes by
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data, suffix=""):
+        path = self._path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name and renamed, so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._evict()
+
+    def get_or_create(self, key, render, suffix=""):
+        """Cached bytes for key, or render() stored under key."""
+        data = self.get(key, suffix)
+        if data is None:
+            data = bytes(render())
+            self.put(key, data, suffix)
+        return data
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue    # evicted by another process meanwhile
+                    entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -0,0 +1,230 @@
+# schema.py
+# Schema migrations for baby_log.db, shared by app.py, gen_report.py and the MQTT broker.
+# Each migration runs once and bumps PRAGMA user_version, so calling migrate() on every start is cheap.
+
+EVENT_TYPES = [
+    "Breastfeeding", "Sleep", "Diaper Change", "Pee", "Poop", "Tummy Time",
+    "Prenatal vitamins", "Vitamin D", "Mom Painmeds", "Mom Antibiotic",
+]
+
+def split_event(s):
+    """Splits a legacy 'type,modifiers+comment' string, e.g. 'Breastfeeding,L,R+Lasted 0:14:00'."""
+    if not isinstance(s, str):
+        s = ""
+    head, _, comment = s.partition('+')
+    event_type, _, modifiers = head.partition(',')
+    return event_type.strip(), modifiers.strip(), comment if comment else None
+
+def join_event(event_type, modifiers):
+    return f"{event_type},{modifiers}" if modifiers else event_type
+
+def event_type_id(c, name):
+    row = c.execute("SELECT id FROM event_types WHERE name = ?", (name,)).fetchone()
+    if row:
+        return row[0]
+    c.execute("INSERT INTO event_types (name) VALUES (?)", (name,))
+    return c.lastrowid
+
+def _create_events_table(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS baby_events (
+            timestamp TEXT,
+            event TEXT
+        )
+    """)
+
+def _add_epoch_timestamp(c):
+    # Integer UTC epoch next to the TEXT timestamp so date windows become an indexed range scan
+    columns = [row[1] for row in c.execute("PRAGMA table_info(baby_events)")]
+    if 'ts' not in columns:
+        c.execute("ALTER TABLE baby_events ADD COLUMN ts INTEGER")
+    c.execute("UPDATE baby_events SET ts = CAST(strftime('%s', timestamp) AS INTEGER) WHERE ts IS NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_baby_events_ts ON baby_events (ts)")
+
+def _normalize_events(c):
+    # Event type, side/colour modifiers and comment get their own columns; the packed
+    # event string is still written for older readers but no longer parsed on load
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS event_types (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+    c.executemany("INSERT OR IGNORE INTO event_types (name) VALUES (?)", [(name,) for name in EVENT_TYPES])
+    columns = [row[1] for row in c.execute("PRAGMA table_info(baby_events)")]
+    if 'type_id' not in columns:
+        c.execute("ALTER TABLE baby_events ADD COLUMN type_id INTEGER REFERENCES event_types (id)")
+        c.execute("ALTER TABLE baby_events ADD COLUMN modifiers TEXT NOT NULL DEFAULT ''")
+        c.execute("ALTER TABLE baby_events ADD COLUMN comment TEXT")
+
+    type_ids = {}
+    updates = []
+    for rowid, event in c.execute("SELECT rowid, event FROM baby_events WHERE type_id IS NULL").fetchall():
+        event_type, modifiers, comment = split_event(event)
+        if event_type not in type_ids:
+            type_ids[event_type] = event_type_id(c, event_type)
+        updates.append((type_ids[event_type], modifiers, comment, rowid))
+    c.executemany("UPDATE baby_events SET type_id = ?, modifiers = ?, comment = ? WHERE rowid = ?", updates)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_baby_events_type_ts ON baby_events (type_id, ts)")
+
+def _add_change_counter(c):
+    # Bumped by triggers on every write to baby_events, whichever process makes it,
+    # so readers can tell whether anything changed with one indexed lookup
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS db_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO db_state (id, version) VALUES (1, 0)")
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS baby_events_{op.lower()}_version AFTER {op} ON baby_events
+            BEGIN
+                UPDATE db_state SET version = version + 1 WHERE id = 1;
+            END
+        """)
+
+def _add_rewrite_counter(c):
+    # Counts only updates and deletes, so a reader holding a window can tell
+    # "rows were appended" (fetch the tail) from "rows changed" (reload)
+    columns = [row[1] for row in c.execute("PRAGMA table_info(db_state)")]
+    if 'rewrites' not in columns:
+        c.execute("ALTER TABLE db_state ADD COLUMN rewrites INTEGER NOT NULL DEFAULT 0")
+    for op in ("UPDATE", "DELETE"):
+        c.execute(f"DROP TRIGGER IF EXISTS baby_events_{op.lower()}_version")
+        c.execute(f"""
+            CREATE TRIGGER baby_events_{op.lower()}_version AFTER {op} ON baby_events
+            BEGIN
+                UPDATE db_state SET version = version + 1, rewrites = rewrites + 1 WHERE id = 1;
+            END
+        """)
+
+def _add_daily_counts(c):
+    # Per local day and event type, kept up to date by storage.py in the same transaction as
+    # each write. Days are in the dashboard's timezone, so the table is filled by
+    # storage.rebuild_daily_counts rather than here.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS daily_counts (
+            day TEXT NOT NULL,
+            type_id INTEGER NOT NULL REFERENCES event_types (id),
+            events INTEGER NOT NULL DEFAULT 0,
+            left_side INTEGER NOT NULL DEFAULT 0,
+            right_side INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, type_id)
+        ) WITHOUT ROWID
+    """)
+
+def _add_ingested_messages(c):
+    # Keys of messages the MQTT broker has stored, so QoS 1 redeliveries are not stored twice
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS ingested_messages (
+            key TEXT PRIMARY KEY,
+            received_at INTEGER NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ingested_messages_received_at ON ingested_messages (received_at)")
+
+def _add_archive_horizon(c):
+    # Events before archived_before (UTC epoch) were moved to Parquet by archive.py; their
+    # days stay in daily_counts, which is therefore only rebuilt from that point on
+    columns = [row[1] for row in c.execute("PRAGMA table_info(db_state)")]
+    if 'archived_before' not in columns:
+        c.execute("ALTER TABLE db_state ADD COLUMN archived_before INTEGER NOT NULL DEFAULT 0")
+
+def _add_rollup_timezone(c):
+    # The zone daily_counts' days were counted in; storage.py rebuilds them when BABY_TIMEZONE
+    # changes. Rollups made before this column existed were all in US/Pacific.
+    columns = [row[1] for row in c.execute("PRAGMA table_info(db_state)")]
+    if 'timezone' not in columns:
+        c.execute("ALTER TABLE db_state ADD COLUMN timezone TEXT NOT NULL DEFAULT 'US/Pacific'")
+
+def _add_event_intervals(c):
+    # Running statistics of the time between events of a type, per block of hours of the
+    # day, and each type's latest event; forecast.py keeps them up to date and
+    # storage.py fills them from the existing events once this has run
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS event_intervals (
+            type_id INTEGER NOT NULL REFERENCES event_types (id),
+            bucket INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            var REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (type_id, bucket)
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS last_events (
+            type_id INTEGER PRIMARY KEY REFERENCES event_types (id),
+            ts INTEGER NOT NULL
+        )
+    """)
+
+def _add_stable_ids(c):
+    # rowid alone is reused once the newest rows are deleted, e.g. by archive.py, so an archived
+    # event and a new one could share it. AUTOINCREMENT never hands an id out twice; the table
+    # is rebuilt to get it, keeping every row's id, and its indexes and triggers are made again.
+    c.execute("""
+        CREATE TABLE baby_events_stable (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            event TEXT,
+            ts INTEGER,
+            type_id INTEGER REFERENCES event_types (id),
+            modifiers TEXT NOT NULL DEFAULT '',
+            comment TEXT
+        )
+    """)
+    c.execute("""
+        INSERT INTO baby_events_stable (id, timestamp, event, ts, type_id, modifiers, comment)
+        SELECT rowid, timestamp, event, ts, type_id, modifiers, comment FROM baby_events
+    """)
+    c.execute("DROP TABLE baby_events")
+    c.execute("ALTER TABLE baby_events_stable RENAME TO baby_events")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_baby_events_ts ON baby_events (ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_baby_events_type_ts ON baby_events (type_id, ts)")
+    _add_change_counter(c)
+    _add_rewrite_counter(c)
+    # An empty table has no sequence row yet; storage.py raises it past ids already archived
+    c.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'baby_events', (SELECT COALESCE(MAX(id), 0) FROM baby_events)
+        WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'baby_events')
+    """)
+
+MIGRATIONS = [
+    _create_events_table,
+    _add_epoch_timestamp,
+    _normalize_events,
+    _add_change_counter,
+    _add_rewrite_counter,
+    _add_daily_counts,
+    _add_ingested_messages,
+    _add_archive_horizon,
+    _add_rollup_timezone,
+    _add_event_intervals,
+    _add_stable_ids,
+]
+DAILY_COUNTS_VERSION = MIGRATIONS.index(_add_daily_counts) + 1
+EVENT_INTERVALS_VERSION = MIGRATIONS.index(_add_event_intervals) + 1
+STABLE_IDS_VERSION = MIGRATIONS.index(_add_stable_ids) + 1
+
+def migrate(conn):
+    """Brings the database up to the latest schema version. Returns the version it started from."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return version
+    # Take the write lock before re-reading the version so two processes starting
+    # together don't both run the same step
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        c = conn.cursor()
+        for step in MIGRATIONS[version:]:
+            step(c)
+        c.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
@@ -0,0 +1,501 @@
+# storage.py
+# SQLite access shared by app.py, gen_report.py and google_home_mqtt_broker.py.
+# Connections are long-lived and pooled per database file, and run in WAL mode so the
+# dashboard and the broker can write the same file without "database is locked" stalls.
+# pandas is imported inside the functions that build frames, so the broker never loads it.
+import os
+import queue
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, time as time_obj
+import pytz
+import forecast
+from schema import (migrate, split_event, join_event, event_type_id, DAILY_COUNTS_VERSION, EVENT_INTERVALS_VERSION,
+                    STABLE_IDS_VERSION)
+
+DATABASE_NAME = "baby_log.db"
+TENANT_DIR = os.environ.get("BABY_TENANT_DIR", "tenants")
+TENANT_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Local days, the dashboard's times and daily_counts all use this zone, e.g. BABY_TIMEZONE=Europe/Berlin
+TIMEZONE = os.environ.get("BABY_TIMEZONE", "US/Pacific")
+LOCAL_TZ = pytz.timezone(TIMEZONE)
+POOL_SIZE = 4
+MAX_POOLS = 32
+BUSY_TIMEOUT_MS = 5000
+CLOSED_POLL_SECONDS = 0.1
+
+# Statements are kept as constants so sqlite3's per-connection statement cache
+# hands back the already prepared statement on every call
+INSERT_EVENT = "INSERT INTO baby_events (timestamp, ts, event, type_id, modifiers, comment) VALUES (?, ?, ?, ?, ?, ?)"
+UPDATE_EVENT = "UPDATE baby_events SET timestamp = ?, ts = ?, event = ?, type_id = ?, modifiers = ?, comment = ? WHERE rowid = ?"
+UPSERT_DAILY_COUNTS = """
+    INSERT INTO daily_counts (day, type_id, events, left_side, right_side) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (day, type_id) DO UPDATE SET
+        events = events + excluded.events,
+        left_side = left_side + excluded.left_side,
+        right_side = right_side + excluded.right_side
+"""
+SELECT_DAILY_COUNTS = """
+    SELECT d.day, t.name AS type, d.events, d.left_side, d.right_side
+    FROM daily_counts d JOIN event_types t ON t.id = d.type_id
+    WHERE d.day >= ? AND d.day <= ? AND d.events > 0 ORDER BY d.day
+"""
+SELECT_LAST_OF_TYPE = """
+    SELECT e.rowid, e.ts, e.modifiers
+    FROM baby_events e JOIN event_types t ON t.id = e.type_id
+    WHERE t.name = ? AND e.ts >= ? ORDER BY e.ts DESC LIMIT 1
+"""
+SET_COMMENT = "UPDATE baby_events SET event = ?, comment = ? WHERE rowid = ?"
+INSERT_MESSAGE_KEY = "INSERT OR IGNORE INTO ingested_messages (key, received_at) VALUES (?, ?)"
+DELETE_MESSAGE_KEYS = "DELETE FROM ingested_messages WHERE received_at < ?"
+SELECT_STATE = "SELECT version, rewrites FROM db_state WHERE id = 1"
+SELECT_ARCHIVED_BEFORE = "SELECT archived_before FROM db_state WHERE id = 1"
+SELECT_ROLLUP_TIMEZONE = "SELECT timezone FROM db_state WHERE id = 1"
+# The windows' upper bound when they run up to now
+NO_END = 2 ** 63 - 1
+RAISE_ID_FLOOR = "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'baby_events'"
+SELECT_WINDOW = """
+    SELECT e.rowid AS rowid, e.ts, t.name AS type, e.modifiers, e.comment AS comments
+    FROM baby_events e JOIN event_types t ON t.id = e.type_id
+    WHERE e.ts >= ? AND e.ts < ? AND e.rowid > ? ORDER BY e.ts DESC
+"""
+SELECT_WINDOW_OF_TYPES = """
+    SELECT e.rowid AS rowid, e.ts, t.name AS type, e.modifiers, e.comment AS comments
+    FROM baby_events e JOIN event_types t ON t.id = e.type_id
+    WHERE e.ts >= ? AND e.ts < ? AND e.rowid > ? AND t.name IN ({}) ORDER BY e.ts DESC
+"""
+
+
+class ConnectionPool:
+    """A small pool of long-lived connections to one database file.
+
+    Streamlit runs every rerun on a fresh thread and paho calls back on its own
+    network thread, so connections are opened with check_same_thread=False and
+    handed out to one borrower at a time.
+    """
+
+    def __init__(self, dbname, size=POOL_SIZE):
+        self.dbname = dbname
+        self.size = size
+        self.closed = False
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if os.path.dirname(self.dbname):
+            os.makedirs(os.path.dirname(self.dbname), exist_ok=True)
+        conn = sqlite3.connect(self.dbname, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, cached_statements=128)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        version = migrate(conn)
+        zone_changed = conn.execute(SELECT_ROLLUP_TIMEZONE).fetchone()[0] != TIMEZONE
+        if version < DAILY_COUNTS_VERSION or zone_changed:
+            # daily_counts was just created, or its days were counted in another timezone
+            with conn:
+                _rebuild_daily_counts(conn.cursor())
+        if version < EVENT_INTERVALS_VERSION or zone_changed:
+            with conn:
+                forecast.rebuild(conn.cursor(), LOCAL_TZ)
+        if version < STABLE_IDS_VERSION and conn.execute(SELECT_ARCHIVED_BEFORE).fetchone()[0]:
+            # Months archived while ids could still be reused may hold ids above every one left in SQLite
+            from archive import max_archived_rowid
+            with conn:
+                conn.execute(RAISE_ID_FLOOR, (max_archived_rowid(self.dbname),))
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size and not self.closed
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        while not self.closed:
+            try:
+                return self._idle.get(timeout=CLOSED_POLL_SECONDS)
+            except queue.Empty:
+                pass
+        # An evicted pool closes borrowed connections as they come back instead of
+        # returning them, so a borrower gets one of its own, closed after use
+        return self._open()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self.closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def close(self):
+        """Closes idle connections now and borrowed ones as they come back."""
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# One pool per database file, least recently used first, so a process serving
+# many households keeps handles open only for the ones in use
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+def get_pool(dbname=DATABASE_NAME):
+    with _pools_lock:
+        pool = _pools.get(dbname)
+        if pool is None:
+            pool = _pools[dbname] = ConnectionPool(dbname)
+            if len(_pools) > MAX_POOLS:
+                _pools.popitem(last=False)[1].close()
+        else:
+            _pools.move_to_end(dbname)
+        return pool
+
+def database_for(tenant=None):
+    """Database file for a household. No tenant means the original single-family baby_log.db."""
+    if not tenant:
+        return DATABASE_NAME
+    if not TENANT_PATTERN.fullmatch(tenant):
+        raise ValueError(f"Invalid tenant name: {tenant!r}")
+    return os.path.join(TENANT_DIR, f"{tenant}.db")
+
+@contextmanager
+def transaction(dbname=DATABASE_NAME):
+    """Borrows a pooled connection and commits everything done with it in one go."""
+    with get_pool(dbname).connection() as conn:
+        with conn:
+            yield conn.cursor()
+
+
+def create_table(dbname=DATABASE_NAME):
+    # Opening the first pooled connection runs the schema migrations
+    with get_pool(dbname).connection():
+        pass
+
+def change_state(dbname=DATABASE_NAME):
+    """Returns (version, rewrites): version moves on every write to baby_events, rewrites only on updates and deletes."""
+    with get_pool(dbname).connection() as conn:
+        return conn.execute(SELECT_STATE).fetchone()
+
+def change_token(dbname=DATABASE_NAME):
+    return change_state(dbname)[0]
+
+def start_of_day_epoch(start_date):
+    #local midnight of start_date as a UTC epoch, matches the ts column
+    return int(LOCAL_TZ.localize(datetime.combine(start_date, time_obj.min)).timestamp())
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def local_day(ts):
+    return date.fromordinal(_EPOCH_ORDINAL + forecast.local_seconds(ts, LOCAL_TZ) // 86400).isoformat()
+
+def _add_to_daily_counts(c, rows, sign=1):
+    #rows are (ts, type_id, modifiers) of events being added (sign=1) or taken away (sign=-1)
+    totals = {}
+    for ts, type_id, modifiers in rows:
+        key = (local_day(ts), type_id)
+        sides = modifiers.split(',')
+        events, left, right = totals.get(key, (0, 0, 0))
+        totals[key] = (events + sign, left + sign * ('L' in sides), right + sign * ('R' in sides))
+    c.executemany(UPSERT_DAILY_COUNTS, [key + value for key, value in totals.items()])
+
+def count_events_after(c, rowid):
+    """Adds the events inserted after rowid to daily_counts, for bulk inserts made in SQL. Returns how many there were."""
+    added = c.execute("SELECT ts, type_id, modifiers FROM baby_events WHERE rowid > ?", (rowid,)).fetchall()
+    _add_to_daily_counts(c, added)
+    forecast.record_events(c, added, LOCAL_TZ)
+    return len(added)
+
+def _rebuild_daily_counts(c, chunk_size=10000):
+    #days before the archive horizon are only counted in daily_counts now, so they are kept
+    archived_before = c.execute(SELECT_ARCHIVED_BEFORE).fetchone()[0]
+    c.execute("DELETE FROM daily_counts WHERE day >= ?", (local_day(archived_before),))
+    events = c.connection.execute(
+        "SELECT ts, type_id, modifiers FROM baby_events WHERE type_id IS NOT NULL AND ts >= ?", (archived_before,))
+    while True:
+        rows = events.fetchmany(chunk_size)
+        if not rows:
+            break
+        _add_to_daily_counts(c, rows)
+    c.execute("UPDATE db_state SET timezone = ? WHERE id = 1", (TIMEZONE,))
+
+def rebuild_daily_counts(dbname=DATABASE_NAME):
+    """Recomputes the daily_counts rollup from baby_events, e.g. after editing the file by hand."""
+    with transaction(dbname) as c:
+        _rebuild_daily_counts(c)
+
+def rebuild_forecast(dbname=DATABASE_NAME):
+    """Recomputes the interval statistics behind next_event from baby_events, e.g. after editing past events."""
+    with transaction(dbname) as c:
+        forecast.rebuild(c, LOCAL_TZ)
+
+def next_event(event_type, dbname=DATABASE_NAME):
+    """forecast.Forecast of when the next event_type is due, or None. A couple of indexed lookups."""
+    with get_pool(dbname).connection() as conn:
+        return forecast.predict(conn, event_type, LOCAL_TZ)
+
+def load_daily_counts(start_date, end_date=None, dbname=DATABASE_NAME):
+    """Per-day, per-type counts (events, left_side, right_side) between two dates, inclusive."""
+    import pandas as pd
+    end_date = end_date or datetime.now(LOCAL_TZ).date()
+    with get_pool(dbname).connection() as conn:
+        df = pd.read_sql_query(SELECT_DAILY_COUNTS, conn, params=(start_date.isoformat(), end_date.isoformat()))
+    df['day'] = pd.to_datetime(df['day']).dt.date
+    return df
+
+def _insert_event(c, now_utc, event, comments=""):
+    event_type, modifiers, _ = split_event(event)
+    type_id = event_type_id(c, event_type)
+    ts = int(now_utc.timestamp())
+    if comments:
+        event=f"{event}+{comments}"
+    c.execute(INSERT_EVENT, (now_utc.strftime("%Y-%m-%d %H:%M:%S"), ts, event, type_id, modifiers, comments or None))
+    return ts, type_id, modifiers
+
+def utc_now():
+    return datetime.now(pytz.utc).replace(microsecond=0)
+
+def write_events(c, events, now_utc):
+    """Inserts (event, comments) pairs on an open cursor, for callers batching several writes in one transaction."""
+    added = [_insert_event(c, now_utc, event, comments) for event, comments in events]
+    _add_to_daily_counts(c, added)
+    forecast.record_events(c, added, LOCAL_TZ)
+    return now_utc
+
+def log_events(events, dbname=DATABASE_NAME, now_utc=None):
+    """Logs several (event, comments) pairs with one timestamp and one commit. Returns the UTC time used."""
+    with transaction(dbname) as c:
+        return write_events(c, events, now_utc or utc_now())
+
+def log_event(event, comments="", dbname=DATABASE_NAME):
+    return log_events([(event, comments)], dbname=dbname)
+
+def load_data(start_date, after_rowid=0, types=None, dbname=DATABASE_NAME, end_date=None):
+    #events from start_date on, up to and including end_date if one is given
+    return _window_frame(_read_window(start_date, after_rowid, types, dbname, end_date)[0])
+
+def _read_window(start_date, after_rowid, types, dbname, end_date=None):
+    #the raw rows and the highest rowid among those still in SQLite, which is where the next tail starts
+    import pandas as pd
+    end_epoch = start_of_day_epoch(end_date + timedelta(days=1)) if end_date else NO_END
+    query, params = SELECT_WINDOW, [start_of_day_epoch(start_date), end_epoch, after_rowid]
+    if types:
+        #only these event types, e.g. what the sleep analysis needs over a long range
+        query = SELECT_WINDOW_OF_TYPES.format(','.join('?' * len(types)))
+        params += list(types)
+    with get_pool(dbname).connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+        archived_before = conn.execute(SELECT_ARCHIVED_BEFORE).fetchone()[0]
+    last_rowid = max(after_rowid, int(df['rowid'].max())) if not df.empty else after_rowid
+    # New rows only ever go into SQLite, so the tail after after_rowid has nothing in the archive
+    if params[0] < archived_before and not after_rowid:
+        #the window reaches back into months archive.py moved to Parquet
+        from archive import read_archive
+        cold = read_archive(dbname, params[0], types, end_epoch if end_date else None)
+        if not cold.empty:
+            # A row can be in both if archiving stopped between writing Parquet and committing.
+            # Its ts tells it apart from an archived event whose id was handed out again.
+            stored = pd.MultiIndex.from_arrays([df['rowid'], df['ts']])
+            cold = cold[~pd.MultiIndex.from_arrays([cold['rowid'], cold['ts']]).isin(stored)]
+            df = pd.concat([df, cold], ignore_index=True).sort_values(['ts', 'rowid'], ascending=False, ignore_index=True)
+    return df, last_rowid
+
+def _window_frame(df):
+    #rowid, ts, type, modifiers, comments -> the window's columns
+    import pandas as pd
+    #straight from the epoch: no text to parse, and no ambiguous local times when the clocks go back
+    df['timestamp'] = pd.to_datetime(df['ts'].astype('int64'), unit='s', utc=True).dt.tz_convert(LOCAL_TZ)
+    df['date'] = df['timestamp'].dt.date
+    df['time'] = df['timestamp'].dt.time
+
+    #event keeps the 'type,modifiers' form used by the table and the editor
+    #astype(str) also types the columns of an empty window, e.g. a new household's
+    df['modifiers'] = df['modifiers'].astype(str)
+    df['type'] = df['type'].astype(str).astype('category')
+    df['event'] = df['type'].astype(str) + df['modifiers'].radd(',').where(df['modifiers'] != '', '')
+
+    return df[['rowid', 'timestamp', 'event', 'date', 'time', 'comments', 'type', 'modifiers']]
+
+def pending_events(events, now_utc, rowid=0):
+    """(event, comments) pairs logged at now_utc, laid out like load_data's rows.
+
+    For showing writes that are still queued; they get `rowid` (no stored row has 0) until they are committed.
+    """
+    import pandas as pd
+    rows = []
+    for event, comments in events:
+        event_type, modifiers, _ = split_event(event)
+        rows.append((rowid, int(now_utc.timestamp()), event_type, modifiers, comments or None))
+    return _window_frame(pd.DataFrame(rows, columns=["rowid", "ts", "type", "modifiers", "comments"]))
+
+def write_last_event_duration(c, event_type, start_date, now_utc):
+    row = c.execute(SELECT_LAST_OF_TYPE, (event_type, start_of_day_epoch(start_date))).fetchone()
+    if row is None:
+        return None
+    rowid, ts, modifiers = row
+    lasted = timedelta(seconds=int(now_utc.timestamp()) - ts)
+    comment = f"Lasted {lasted}"
+    c.execute(SET_COMMENT, (f"{join_event(event_type, modifiers)}+{comment}", comment, rowid))
+    return lasted
+
+def set_last_event_duration(event_type, start_date, dbname=DATABASE_NAME, now_utc=None):
+    """Comments 'Lasted H:MM:SS' (time since it was logged) on the last event_type since start_date.
+
+    Plain SQL on the (type_id, ts) index, no frames. Returns the duration, or None if there was no such event.
+    """
+    with transaction(dbname) as c:
+        return write_last_event_duration(c, event_type, start_date, now_utc or utc_now())
+
+def claim_message(c, key, now_utc):
+    """Records an ingested message key. False if it was seen before, i.e. this is a redelivery."""
+    c.execute(INSERT_MESSAGE_KEY, (key, int(now_utc.timestamp())))
+    return c.rowcount == 1
+
+def prune_message_keys(c, before_utc):
+    c.execute(DELETE_MESSAGE_KEYS, (int(before_utc.timestamp()),))
+
+EDITABLE_COLUMNS = ['date', 'time', 'event', 'comments']
+
+def changed_rows(df_original, df_edited):
+    """Rows of df_edited whose editable columns differ from df_original, matched on rowid."""
+    import pandas as pd
+    before = df_original.set_index('rowid')[EDITABLE_COLUMNS].reindex(df_edited['rowid'])
+    after = df_edited.set_index('rowid')[EDITABLE_COLUMNS]
+    # None, NaN and '' are all "no comment"
+    before['comments'] = before['comments'].fillna('')
+    after['comments'] = after['comments'].fillna('')
+    same = (after == before).all(axis=1)
+    return df_edited[~same.to_numpy()]
+
+def edited_updates(df_edited):
+    """Validates edited rows and turns them into write_updates' rows; a bad date/time raises ValueError."""
+    import numpy as np
+    import pandas as pd
+    missing = df_edited['date'].isna() | df_edited['time'].isna()
+    if missing.any():
+        raise ValueError(f"Missing date or time for row {df_edited['rowid'][missing].iloc[0]}")
+    if df_edited.empty:
+        return []
+    wall = pd.Series(pd.to_datetime([datetime.combine(d, t) for d, t in zip(df_edited['date'], df_edited['time'])]))
+    if 'timestamp' in df_edited:
+        # A row whose date and time were left alone keeps its instant. Localizing the shown wall time
+        # again would move an event in the first 01:xx of the night the clocks go back by an hour.
+        local = pd.Series(df_edited['timestamp'].to_numpy(), dtype=df_edited['timestamp'].dtype)
+        moved = ((local.dt.date != pd.Series(df_edited['date'].to_numpy()))
+                 | (local.dt.time != pd.Series(df_edited['time'].to_numpy()))).to_numpy()
+    else:
+        local = pd.Series(pd.NaT, index=wall.index, dtype=f"datetime64[s, {LOCAL_TZ.zone}]")
+        moved = np.ones(len(wall), dtype=bool)
+    if moved.any():
+        # The edited rows are localized at once; a time in the repeated hour when the clocks go back is read as standard time
+        local[moved] = wall[moved].dt.tz_localize(LOCAL_TZ, ambiguous=np.zeros(moved.sum(), dtype=bool),
+                                                  nonexistent='shift_forward')
+    epochs = (local - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    utc_text = local.dt.tz_convert('UTC').dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    updates = []
+    for rowid, ts, timestamp, event, comments in zip(df_edited['rowid'], epochs, utc_text,
+                                                     df_edited['event'], df_edited['comments']):
+        event_type, modifiers, _ = split_event(event)
+        comment = comments if isinstance(comments, str) and comments else None
+        if comment:
+            combined_event_comment = f"{join_event(event_type, modifiers)}+{comment}"
+        else:
+            combined_event_comment = join_event(event_type, modifiers)
+        updates.append((timestamp, int(ts), combined_event_comment, event_type, modifiers, comment, int(rowid)))
+    return updates
+
+def write_updates(c, updates):
+    """Applies edited_updates' rows on an open cursor. Returns the number of rows written."""
+    type_ids = {name: event_type_id(c, name) for name in {u[3] for u in updates}}
+    updates = [u[:3] + (type_ids[u[3]],) + u[4:] for u in updates]
+    rowids = [u[-1] for u in updates]
+    for i in range(0, len(rowids), 500):
+        chunk = rowids[i:i + 500]
+        before = c.execute(f"SELECT ts, type_id, modifiers FROM baby_events WHERE rowid IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+        if len(before) != len(chunk):
+            raise ValueError("Archived events can't be edited")
+        _add_to_daily_counts(c, before, sign=-1)
+    c.executemany(UPDATE_EVENT, updates)
+    _add_to_daily_counts(c, [(u[1], u[3], u[4]) for u in updates])
+    return len(updates)
+
+def update_logs(df_edited, dbname=DATABASE_NAME):
+    """Writes edited rows back by rowid in one transaction. Returns the number of rows written.
+
+    Every row is validated first, so a bad date/time raises ValueError before anything is written.
+    """
+    updates = edited_updates(df_edited)
+    if not updates:
+        return 0
+    with transaction(dbname) as c:
+        return write_updates(c, updates)
+
+
+class EventWindow:
+    """The parsed events from start_date on, kept in memory and topped up from the tail.
+
+    Appended rows are fetched by rowid and parsed on their own. Any update or
+    delete since the last call falls back to a full reload.
+    """
+
+    def __init__(self, start_date, dbname=DATABASE_NAME):
+        self.start_date = start_date
+        self.dbname = dbname
+        self.df = None
+        self.state = None
+        self.last_rowid = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        import pandas as pd
+        # Read the state before loading, a write racing the load is then picked up next call
+        state = change_state(self.dbname)
+        with self._lock:
+            if self.df is None or state[1] != self.state[1]:
+                df, self.last_rowid = _read_window(self.start_date, 0, None, self.dbname)
+                self.df = _window_frame(df)
+            elif state[0] != self.state[0]:
+                new_rows, self.last_rowid = _read_window(self.start_date, self.last_rowid, None, self.dbname)
+                new_rows = _window_frame(new_rows)
+                if not new_rows.empty:
+                    df = pd.concat([new_rows, self.df], ignore_index=True)
+                    df['type'] = df['type'].astype('category')
+                    self.df = df.sort_values('timestamp', ascending=False, kind='stable', ignore_index=True)
+            self.state = state
+            return self.df
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Maintenance commands for baby_log.db")
+    parser.add_argument("command", choices=["rebuild-daily-counts", "rebuild-forecast"])
+    parser.add_argument("--db", default=DATABASE_NAME)
+    args = parser.parse_args()
+    if args.command == "rebuild-daily-counts":
+        rebuild_daily_counts(args.db)
+        print(f"Rebuilt daily_counts in {args.db}")
+    elif args.command == "rebuild-forecast":
+        rebuild_forecast(args.db)
+        print(f"Rebuilt the event interval statistics in {args.db}")
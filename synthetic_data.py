@@ -0,0 +1,87 @@
+# synthetic_data.py
+# Writes made-up but realistic baby_events rows (feeds, diapers, sleeps, vitamins) for
+# benchmarks and for trying the dashboard without a real history.
+import argparse
+import random
+import pytz
+from datetime import datetime, timedelta
+import storage
+from schema import split_event, event_type_id
+from storage import LOCAL_TZ
+
+POOP_COLORS = ["yellow", "yellow", "yellow", "green", "brown", "orange"]
+POOP_COMMENTS = ["seedy", "a lot", "blowout", "small"]
+
+
+def generate_events(days, end=None, seed=0):
+    """Returns (local datetime, event string) pairs, oldest first, for `days` days up to `end`.
+
+    Event strings use the legacy 'type,modifiers+comment' form, e.g. 'Breastfeeding,L,R+Lasted 0:14:00'.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now(LOCAL_TZ)
+    t = end - timedelta(days=days)
+    events = []
+    last_vitamins = None
+    while t < end:
+        # A feed every 2-4 hours, usually followed by a change and often by a nap
+        side = rng.choice(["L", "R", "L,R", "R,L"])
+        feed = f"Breastfeeding,{side}"
+        if rng.random() < 0.5:
+            feed += f"+Lasted {timedelta(minutes=rng.randint(8, 35), seconds=rng.randint(0, 59))}"
+        events.append((t, feed))
+
+        if rng.random() < 0.85:
+            change = t + timedelta(minutes=rng.randint(20, 45))
+            events.append((change, "Diaper Change"))
+            if rng.random() < 0.8:
+                events.append((change, "Pee"))
+            if rng.random() < 0.3:
+                poop = f"Poop, {rng.choice(POOP_COLORS)}"
+                if rng.random() < 0.2:
+                    poop += f"+{rng.choice(POOP_COMMENTS)}"
+                events.append((change, poop))
+        if rng.random() < 0.6:
+            events.append((t + timedelta(minutes=rng.randint(40, 60)), "Sleep"))
+
+        local = t.astimezone(LOCAL_TZ)
+        if local.hour >= 9 and last_vitamins != local.date():
+            last_vitamins = local.date()
+            events.append((t + timedelta(minutes=5), "Vitamin D"))
+            events.append((t + timedelta(minutes=6), "Prenatal vitamins"))
+            if rng.random() < 0.7:
+                events.append((t + timedelta(minutes=70), "Tummy Time"))
+
+        t += timedelta(minutes=rng.randint(120, 240))
+    events = [(when, event) for when, event in events if when < end]
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def write_events(events, dbname):
+    """Appends generated events to dbname in one transaction and refreshes its daily rollup and forecast."""
+    storage.create_table(dbname)
+    with storage.transaction(dbname) as c:
+        type_ids = {}
+        rows = []
+        for when, event in events:
+            event_type, modifiers, comment = split_event(event)
+            if event_type not in type_ids:
+                type_ids[event_type] = event_type_id(c, event_type)
+            utc = when.astimezone(pytz.utc)
+            rows.append((utc.strftime('%Y-%m-%d %H:%M:%S'), event, int(utc.timestamp()), type_ids[event_type], modifiers, comment))
+        c.executemany(
+            "INSERT INTO baby_events (timestamp, event, ts, type_id, modifiers, comment) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    storage.rebuild_daily_counts(dbname)
+    storage.rebuild_forecast(dbname)
+    return len(events)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fills a database with synthetic baby events")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--db", default="synthetic.db")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    n = write_events(generate_events(args.days, seed=args.seed), args.db)
+    print(f"Wrote {n} events covering {args.days} days to {args.db}")
@@ -0,0 +1,104 @@
+# tests/test_sleep_sessions.py
+# analyze_sleep_durations against the iterrows state machine it replaced, on hand-made
+# edge cases and on randomized windows shaped like storage.load_data's.
+from datetime import date, datetime, timedelta
+import random
+
+import pandas as pd
+import pytest
+
+from metrics import analyze_sleep_durations
+from storage import LOCAL_TZ
+
+TYPES = ["Sleep", "Diaper Change", "Breastfeeding", "Pee", "Poop", "Tummy Time"]
+START = LOCAL_TZ.localize(datetime(2026, 3, 1, 6, 0))
+
+
+def reference_sleep_durations(df, start_date):
+    """The loop analyze_sleep_durations replaced, with same-second events in rowid order."""
+    df = df[df['timestamp'].dt.date >= start_date].sort_values(by=['timestamp', 'rowid'])
+
+    sleep_data = []
+    sleep_start = None
+
+    for index, row in df.iterrows():
+        event_type = row['type']
+        timestamp = row['timestamp']
+
+        if event_type == "Sleep":
+            sleep_start = timestamp
+        elif sleep_start and event_type in ("Diaper Change", "Breastfeeding"):
+            sleep_end = timestamp
+            duration = sleep_end - sleep_start
+            sleep_data.append((sleep_start, duration))
+            sleep_start = None  # Reset sleep start
+
+    if sleep_data:
+        return pd.DataFrame(sleep_data, columns=['start_time', 'duration'])
+    return pd.DataFrame(columns=['start_time', 'duration'])
+
+
+def window(events):
+    """A newest-first frame of (seconds after START, type) events, rowids in the order given."""
+    frame = pd.DataFrame({
+        'rowid': range(1, len(events) + 1),
+        'timestamp': pd.Series([START + timedelta(seconds=s) for s, _ in events], dtype=f"datetime64[s, {LOCAL_TZ.zone}]"),
+        'type': pd.Series([t for _, t in events], dtype=str).astype('category'),
+    })
+    return frame.sort_values(['timestamp', 'rowid'], ascending=False).reset_index(drop=True)
+
+
+def sessions(result):
+    return list(zip(result['start_time'], result['duration']))
+
+
+def assert_same(df, start_date):
+    assert sessions(analyze_sleep_durations(df, start_date)) == sessions(reference_sleep_durations(df, start_date))
+
+
+def test_repeated_sleep_counts_from_the_later_one():
+    df = window([(0, "Sleep"), (600, "Sleep"), (700, "Pee"), (3600, "Diaper Change"), (4000, "Breastfeeding")])
+    result = analyze_sleep_durations(df, START.date())
+    assert sessions(result) == [(df['timestamp'].iloc[3], pd.Timedelta(seconds=3000))]
+    assert_same(df, START.date())
+
+
+def test_events_in_the_same_second_follow_rowid():
+    df = window([(0, "Sleep"), (0, "Breastfeeding"), (60, "Breastfeeding"), (60, "Sleep"), (120, "Diaper Change")])
+    assert sessions(analyze_sleep_durations(df, START.date())) == [
+        (df['timestamp'].iloc[-1], pd.Timedelta(0)),
+        (df['timestamp'].iloc[1], pd.Timedelta(seconds=60)),
+    ]
+    assert_same(df, START.date())
+
+
+@pytest.mark.parametrize("events", [
+    [],
+    [(0, "Pee"), (60, "Breastfeeding"), (120, "Diaper Change")],
+    [(0, "Sleep")],
+    [(0, "Diaper Change"), (60, "Sleep"), (120, "Sleep")],
+])
+def test_windows_without_a_finished_sleep(events):
+    df = window(events)
+    assert analyze_sleep_durations(df, START.date()).empty
+    assert reference_sleep_durations(df, START.date()).empty
+
+
+def test_sleep_before_start_date_is_left_out():
+    df = window([(0, "Sleep"), (86400, "Breastfeeding"), (90000, "Sleep"), (93600, "Diaper Change")])
+    start_date = START.date() + timedelta(days=1)
+    assert len(analyze_sleep_durations(df, start_date)) == 1
+    assert_same(df, start_date)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_reference_on_random_windows(seed):
+    rng = random.Random(seed)
+    seconds = 0
+    events = []
+    for _ in range(rng.randrange(0, 80)):
+        #a third of the events share a second with the one before
+        seconds += 0 if rng.random() < 0.3 else rng.randrange(1, 4 * 3600)
+        events.append((seconds, rng.choices(TYPES, weights=[4, 3, 3, 1, 1, 1])[0]))
+    start_date = START.date() + timedelta(days=rng.randrange(0, 3))
+    assert_same(window(events), start_date)
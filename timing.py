@@ -0,0 +1,67 @@
+# timing.py
+# Wall-clock timings of the named stages of one dashboard rerun, broker message or report.
+# A disabled StageTimer hands out one shared no-op context, so leaving the hooks in costs
+# next to nothing; an enabled one can also append each run to a JSON-lines log.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+# Every finished run is appended here when set, e.g. BABY_TIMING_LOG=timings.jsonl
+TIMING_LOG = os.environ.get("BABY_TIMING_LOG")
+
+_NO_STAGE = nullcontext()
+_log_lock = threading.Lock()
+
+
+class StageTimer:
+    """Times `with timer.stage(name):` blocks; finish() returns and logs them."""
+
+    def __init__(self, source, enabled=True, log_path=TIMING_LOG, started=None):
+        self.source = source
+        self.log_path = log_path
+        self.enabled = enabled or bool(log_path)
+        self.stages = {}
+        self.fields = {}
+        self._started = started or time.perf_counter()    # a perf_counter() value, e.g. taken before the imports
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NO_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # A stage entered more than once (e.g. per batch) adds up
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    def add(self, name, ms):
+        """A duration measured elsewhere, e.g. a commit timed by the write queue."""
+        if self.enabled:
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def record(self, **fields):
+        """Extra context for the log line, e.g. the tenant or the number of rows."""
+        if self.enabled:
+            self.fields.update(fields)
+
+    def finish(self):
+        """Stage timings in ms, plus 'total' since the timer was created."""
+        if not self.enabled:
+            return {}
+        timings = {name: round(ms, 3) for name, ms in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self._started) * 1000, 3)
+        if self.log_path:
+            line = {"at": datetime.now(timezone.utc).isoformat(), "source": self.source, "ms": timings, **self.fields}
+            try:
+                with _log_lock, open(self.log_path, "a") as f:
+                    f.write(json.dumps(line, default=str) + "\n")
+            except OSError as e:
+                print(f"Could not write timings to {self.log_path}: {e}")
+        return timings
@@ -0,0 +1,147 @@
+# write_queue.py
+# A bounded queue of pending writes drained by one writer thread. Bursts are applied in a
+# single transaction, so callers (e.g. paho's network thread) never wait on disk I/O.
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+import storage
+
+Job = namedtuple("Job", ["write", "key", "received", "on_done", "on_error", "dbname"])
+_STOP = object()
+DUPLICATE = object()
+# Keys only have to outlive QoS 1 redelivery, which happens within one broker session
+MESSAGE_KEY_TTL = timedelta(minutes=10)
+
+
+class WriteQueue:
+    """Applies queued writes in batches on a dedicated thread.
+
+    A write is a function taking an open cursor, e.g.
+    ``lambda c: storage.write_events(c, events, now_utc)``. Writes submitted with
+    a key are skipped if that key was already stored, which makes redelivered
+    messages idempotent. on_done gets the write's result, or DUPLICATE for a skipped
+    redelivery, so a caller can acknowledge the message either way.
+    """
+
+    def __init__(self, dbname=storage.DATABASE_NAME, maxsize=1000, batch_size=100, on_commit=None):
+        self.dbname = dbname
+        self.batch_size = batch_size
+        self.on_commit = on_commit    # called with (batch size, commit ms) after every batch
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "writes": 0, "duplicates": 0, "failed": 0, "dropped": 0,
+                       "last_commit_ms": 0.0, "total_commit_ms": 0.0}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Finishes the writes already queued, then stops the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def submit(self, write, key=None, on_done=None, on_error=None, dbname=None):
+        """Queues a write without blocking. Returns False (and counts a drop) if the queue is full.
+
+        dbname picks another tenant's database; by default the queue's own is used.
+        """
+        try:
+            self._queue.put_nowait(Job(write, key, storage.utc_now(), on_done, on_error, dbname or self.dbname))
+            return True
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_commit_ms"] = stats.pop("total_commit_ms") / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._apply(batch)
+
+    def _write(self, c, job):
+        if job.key is not None and not storage.claim_message(c, job.key, job.received):
+            return DUPLICATE
+        return job.write(c)
+
+    def _apply(self, batch):
+        started = time.perf_counter()
+        #one transaction per database in the batch, results are put back in submission order
+        results = [None] * len(batch)
+        by_db = {}
+        for i, job in enumerate(batch):
+            by_db.setdefault(job.dbname, []).append(i)
+        for dbname, indexes in by_db.items():
+            for i, result in zip(indexes, self._apply_to(dbname, [batch[i] for i in indexes])):
+                results[i] = result
+        commit_ms = (time.perf_counter() - started) * 1000
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["last_commit_ms"] = commit_ms
+            self._stats["total_commit_ms"] += commit_ms
+
+        for job, result in zip(batch, results):
+            if result is DUPLICATE:
+                self._count("duplicates")
+                self._callback(job.on_done, result)
+            elif isinstance(result, Exception):
+                self._count("failed")
+                self._callback(job.on_error, result, default=lambda e: print(f"Write failed: {e}"))
+            else:
+                self._count("writes")
+                self._callback(job.on_done, result)
+        if self.on_commit:
+            self._callback(lambda size: self.on_commit(size, commit_ms), len(batch))
+
+    def _apply_to(self, dbname, jobs):
+        try:
+            with storage.transaction(dbname) as c:
+                results = [self._write(c, job) for job in jobs]
+                storage.prune_message_keys(c, jobs[-1].received - MESSAGE_KEY_TTL)
+            return results
+        except Exception:
+            # Retry one by one so a single bad write doesn't take the rest of the batch with it
+            results = []
+            for job in jobs:
+                try:
+                    with storage.transaction(dbname) as c:
+                        results.append(self._write(c, job))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+    def _callback(self, callback, result, default=None):
+        callback = callback or default
+        if callback is None:
+            return
+        try:
+            callback(result)
+        except Exception as e:
+            print(f"Error in write callback: {e}")